@@ -0,0 +1,214 @@
+"""Throughput benchmark running the real scraper headless against the offline mock storefront.
+
+Reports products/sec, per-stage latency and peak RSS of the whole process tree (python, chromedriver and chrome).
+With --compare-blocking the product pages are only loaded, once without and once with the resource blocking profile.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from selenium.webdriver.support.ui import WebDriverWait
+import cult_beauty
+from mock_storefront import MockStorefront, generate_catalog
+
+JAVASCRIPT_PAGE_COMPLETE = "return document.readyState === 'complete';"
+JAVASCRIPT_GET_TRANSFERRED_BYTES = """
+return performance.getEntries().reduce(function (total, entry) { return total + (entry.transferSize || 0); }, 0);
+"""
+
+
+def summarize(samples: list[float]):
+    ordered = sorted(samples)
+    return {
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def summarize_histograms(histograms: list[dict[str, object]]):
+    """merge the stage histograms exported by the scraper workers, percentiles are the upper bound of their bucket"""
+    merged = {}
+    for histogram in histograms:
+        stage = merged.setdefault(histogram['stage'], {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(histogram['buckets'])})
+        stage['count'] += histogram['count']
+        stage['sum'] += histogram['sum']
+        stage['max'] = max(stage['max'], histogram['max'])
+        stage['buckets'] = [x + y for x, y in zip(stage['buckets'], histogram['buckets'])]
+
+    def quantile(stage, q):
+        cumulative = 0
+        for bound, count in zip(cult_beauty.METRICS_BUCKETS_SEC, stage['buckets']):
+            cumulative += count
+            if cumulative >= q * stage['count']:
+                return min(bound, stage['max']) * 1000
+        return stage['max'] * 1000
+
+    return {name: {'calls': stage['count'], 'total_sec': stage['sum'], 'mean_ms': stage['sum'] / stage['count'] * 1000,
+                   'p50_ms': quantile(stage, 0.5), 'p95_ms': quantile(stage, 0.95), 'max_ms': stage['max'] * 1000}
+            for name, stage in merged.items() if stage['count']}
+
+
+class RssSampler(threading.Thread):
+    """background thread tracking the peak RSS of the current process tree"""
+
+    def __init__(self, interval = 0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, cult_beauty.get_process_tree_rss(os.getpid()))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, cult_beauty.get_process_tree_rss(os.getpid()))
+
+
+def measure_page_loads(storefront: MockStorefront, blocking_profile: dict[str, bool], chrome_arguments: list[str]):
+    """load every product page of the mock catalog with one driver, time each wd.get (returning once the page is usable
+    with PAGE_LOAD_STRATEGY) and the time until the load event once every remaining resource finished
+
+    Args:
+        storefront (MockStorefront): the running mock storefront
+        blocking_profile (dict[str, bool]): resource groups to be blocked, empty to load everything
+        chrome_arguments (list[str]): extra chrome arguments
+
+    Returns:
+        dict[str, object]: page load latency summary, load event latency summary and mean transferred bytes per page
+    """
+    browser_options = cult_beauty.create_browser_options(blocking_profile)
+    for argument in chrome_arguments:
+        browser_options.add_argument(argument)
+    load_times = []
+    complete_times = []
+    transferred = []
+    with cult_beauty.start_driver(browser_options, blocking_profile) as wd:
+        wd.get(storefront.product_links[0])
+        for url in storefront.product_links:
+            start = time.perf_counter()
+            wd.get(url)
+            load_times.append(time.perf_counter() - start)
+            WebDriverWait(wd, 60, poll_frequency=0.01).until(lambda driver: driver.execute_script(JAVASCRIPT_PAGE_COMPLETE))
+            complete_times.append(time.perf_counter() - start)
+            transferred.append(wd.execute_script(JAVASCRIPT_GET_TRANSFERRED_BYTES))
+    return {'pages': len(load_times), **summarize(load_times), 
+            'complete': summarize(complete_times), 'mean_transferred_kb': statistics.fmean(transferred) / 1024}
+
+
+def compare_blocking(storefront: MockStorefront, chrome_arguments: list[str]):
+    """measure product page loads without and with RESOURCE_BLOCKING and print both"""
+    report = {
+        'unblocked': measure_page_loads(storefront, {}, chrome_arguments),
+        'blocked': measure_page_loads(storefront, cult_beauty.RESOURCE_BLOCKING, chrome_arguments),
+    }
+    print(f'{"profile":<12}{"pages":>8}{"mean ms":>12}{"p50 ms":>12}{"p95 ms":>12}{"load ev ms":>12}{"KB/page":>12}')
+    for profile, values in report.items():
+        print(f'{profile:<12}{values["pages"]:>8}{values["mean_ms"]:>12.1f}{values["p50_ms"]:>12.1f}'
+              f'{values["p95_ms"]:>12.1f}{values["complete"]["mean_ms"]:>12.1f}{values["mean_transferred_kb"]:>12.1f}')
+    print(f'Mean page load speedup: {report["unblocked"]["mean_ms"] / report["blocked"]["mean_ms"]:.2f}x, '
+          f'load event: {report["unblocked"]["complete"]["mean_ms"] / report["blocked"]["complete"]["mean_ms"]:.2f}x')
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper against a local mock storefront.')
+    parser.add_argument('--categories', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=2, help='listing pages per category')
+    parser.add_argument('--products-per-page', type=int, default=6)
+    parser.add_argument('--images', type=int, default=4, help='carousel images per variant')
+    parser.add_argument('--max-variants', type=int, default=8)
+    parser.add_argument('--shared-products', type=float, default=0.0,
+                        help='share of listing slots reusing a product of a previous category, only deduplicated with several workers')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of chrome workers of the scraper')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server waits before answering html requests')
+    parser.add_argument('--asset-latency', type=float, default=0.0,
+                        help='seconds the server waits before answering image, font and tracker requests')
+    parser.add_argument('--compare-blocking', action='store_true',
+                        help='only time product page loads without and with the resource blocking profile')
+    parser.add_argument('--no-blocking', action='store_true', help='scrape without the resource blocking profile')
+    parser.add_argument('--max-rps', type=float, default=None, help='override RATE_LIMIT_MAX_REQUESTS_PER_SEC of the scraper')
+    parser.add_argument('--tabs', type=int, default=None, help='override TABS_PER_WORKER of the scraper, 1 disables prefetching')
+    parser.add_argument('--http-fast-path', action='store_true', help='parse single variant products over plain http')
+    parser.add_argument('--chrome-arg', action='append', default=[], help='extra chrome argument e.g. --no-sandbox')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report as json to this path')
+    parser.add_argument('--log-level', type=str.upper, default=cult_beauty.LOGGING_LEVEL, help='level of the scraper log file')
+    args = parser.parse_args()
+    log_listener = cult_beauty.setup_logging(args.log_level)
+    try:
+        run_benchmark(args)
+    finally:
+        log_listener.stop()
+
+
+def run_benchmark(args: argparse.Namespace):
+    """run the benchmark described by the parsed command line arguments"""
+    if args.max_rps is not None:
+        cult_beauty.RATE_LIMIT_MAX_REQUESTS_PER_SEC = args.max_rps
+    if args.tabs is not None:
+        cult_beauty.TABS_PER_WORKER = args.tabs
+    cult_beauty.USE_HTTP_FAST_PATH = args.http_fast_path
+    if args.no_blocking:
+        cult_beauty.RESOURCE_BLOCKING = {}
+        cult_beauty.browser_options = cult_beauty.create_browser_options()
+    for argument in args.chrome_arg:
+        cult_beauty.browser_options.add_argument(argument)
+
+    catalog = generate_catalog(args.categories, args.pages, args.products_per_page, args.images, args.max_variants, args.seed, args.shared_products)
+    if args.compare_blocking:
+        with MockStorefront(catalog, latency=args.latency, asset_latency=args.asset_latency) as storefront:
+            report = compare_blocking(storefront, args.chrome_arg)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(report, output, indent=2)
+        return
+
+    sampler = RssSampler()
+    with MockStorefront(catalog, latency=args.latency, asset_latency=args.asset_latency) as storefront:
+        sampler.start()
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as checkpoint_folder:
+            store = cult_beauty.CheckpointStore(os.path.join(checkpoint_folder, 'checkpoint.sqlite'))
+            cult_beauty.METRICS_PATH = os.path.join(checkpoint_folder, 'metrics')
+            variant_count = len(cult_beauty.scrape_categories(storefront.category_links, args.workers, store))
+            store.close()
+            with open(f'{cult_beauty.METRICS_PATH}.json') as metrics:
+                stages = summarize_histograms(json.load(metrics)['histograms'])
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        product_count = storefront.product_count
+
+    report = {
+        'workers': args.workers,
+        'products': product_count,
+        'variants': variant_count,
+        'elapsed_sec': elapsed,
+        'products_per_sec': product_count / elapsed,
+        'variants_per_sec': variant_count / elapsed,
+        'peak_rss_mb': sampler.peak / 2 ** 20,
+        'stages': stages,
+    }
+    print(f'Products: {product_count}  Variants: {variant_count}  Workers: {args.workers}')
+    print(f'Elapsed: {elapsed:.2f}s  Products/sec: {report["products_per_sec"]:.3f}  Variants/sec: {report["variants_per_sec"]:.3f}')
+    print(f'Peak RSS (process tree): {report["peak_rss_mb"]:.1f} MB')
+    if stages:
+        print(f'{"stage":<40}{"calls":>8}{"mean ms":>12}{"p50 ms":>12}{"p95 ms":>12}{"total s":>12}')
+        for stage, values in stages.items():
+            print(f'{stage:<40}{values["calls"]:>8}{values["mean_ms"]:>12.1f}{values["p50_ms"]:>12.1f}'
+                  f'{values["p95_ms"]:>12.1f}{values["total_sec"]:>12.2f}')
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,35 +2,55 @@ from selenium.webdriver.chrome import webdriver, options
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.relative_locator import By 
 from selenium.webdriver.support.select import Select 
-from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, StaleElementReferenceException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException, ElementNotInteractableException, StaleElementReferenceException, TimeoutException, WebDriverException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from urllib.parse import urlsplit
+from urllib.parse import urlsplit, urljoin
+from html.parser import HTMLParser
+import urllib3
+import json
 import os
 import pandas as pd
 from selenium.webdriver.support.color import Color
 import time
-from concurrent.futures import ProcessPoolExecutor
-from multiprocessing import current_process 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, Future, as_completed
+from multiprocessing import current_process, Manager
+from queue import Queue, Empty
+from collections import deque
+import threading
+import functools
+import signal
+import hashlib
+import sqlite3
+import argparse
+import itertools
+import multiprocessing
 import logging
 import gzip
 import shutil
 import datetime
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 from tqdm import tqdm
 import time
 import re
 from langdetect import DetectorFactory, detect
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 DetectorFactory.seed = 0
 
-LOGGING_LEVEL = logging.DEBUG
+LOGGING_LEVEL = os.environ.get('CULT_BEAUTY_LOG_LEVEL', 'INFO').upper()
 LOGGING_FOLDER = './scraping_logs'
 LOGGING_FILE = f'{LOGGING_FOLDER}/cult_beauty.log'
 
-if not os.path.isdir(LOGGING_FOLDER):
-    os.makedirs(LOGGING_FOLDER)
-
 def rotator(source, dest):
     with open(source, 'rb') as f_in:
         with gzip.open(f'{dest}.gz', 'wb') as f_out:
@@ -51,18 +71,243 @@ logging_formatter = logging.Formatter(
     fmt='%(asctime)s %(processName)s %(filename)s Line.%(lineno)d %(levelname)s: %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S')
 
-file_handler = TimedRotatingFileHandler(filename=LOGGING_FILE, when='midnight')
-file_handler.setFormatter(logging_formatter)
-file_handler.namer = filer
-file_handler.rotator = rotator
-
 stream_handler = logging.StreamHandler()
 stream_handler.setFormatter(logging_formatter)
 
-logger.addHandler(file_handler)
-
 logger.setLevel(LOGGING_LEVEL)
 
+log_queue = None
+
+def create_file_handler():
+    """create the handler writing the log file, rotated at midnight into gzip archives
+
+    Returns:
+        TimedRotatingFileHandler: the handler
+    """
+    if not os.path.isdir(LOGGING_FOLDER):
+        os.makedirs(LOGGING_FOLDER)
+    file_handler = TimedRotatingFileHandler(filename=LOGGING_FILE, when='midnight')
+    file_handler.setFormatter(logging_formatter)
+    file_handler.namer = filer
+    file_handler.rotator = rotator
+    return file_handler
+
+def attach_queue_handler(queue, level: str = None):
+    """replace the handlers of the module logger by a single handler pushing records to the log queue
+
+    Args:
+        queue (multiprocessing.Queue): the queue drained by the listener of the parent process
+        level (str, optional): the logging level e.g. INFO. Defaults to None (LOGGING_LEVEL).
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(queue))
+    logger.setLevel(level or LOGGING_LEVEL)
+
+def setup_logging(level: str = None):
+    """route the records of this process and of every worker through a queue to one listener thread owning the log file,
+    so workers never block on file i/o and only one process rotates the file
+
+    Args:
+        level (str, optional): the logging level e.g. INFO. Defaults to None (LOGGING_LEVEL).
+
+    Returns:
+        QueueListener: the started listener, to be stopped once the run is over
+    """
+    global log_queue
+    log_queue = multiprocessing.Queue(-1)
+    attach_queue_handler(log_queue, level)
+    listener = QueueListener(log_queue, create_file_handler(), respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+RATE_LIMIT_MAX_REQUESTS_PER_SEC = 4
+RATE_LIMIT_INITIAL_INTERVAL_SEC = 1
+RATE_LIMIT_MAX_INTERVAL_SEC = 30
+RATE_LIMIT_TARGET_LATENCY_SEC = 5
+CURRENCY_CHANGE_TIMEOUT_SEC = 5
+PAGE_LOAD_STRATEGY = 'eager'
+PAGE_READY_TIMEOUT_SEC = 10
+SESSION_SETUP_ATTEMPTS = 3
+SESSION_CURRENCY = '€ (EUR)'
+CHECKPOINT_PATH = './cult_beauty_checkpoint.sqlite'
+METRICS_PATH = './cult_beauty_metrics'
+METRICS_EXPORT_INTERVAL_SEC = 30
+METRICS_BUCKETS_SEC = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+JAVASCRIPT_EXECUTE_CLICK = "arguments[0].click();"
+JAVASCRIPT_IMAGE_SOURCE = """
+function firstCandidate(srcset) { return srcset && srcset.trim() ? srcset.trim().split(',')[0].trim().split(' ')[0] : null; }
+function absolute(url) { return url ? new URL(url, document.baseURI).href : null; }
+function imageSource(image) {
+    var src = image.getAttribute('src');
+    if (image.getAttribute('data-src')) { return absolute(image.getAttribute('data-src')); }
+    if (src && !src.startsWith('data:')) { return absolute(src); }
+    return absolute(firstCandidate(image.getAttribute('srcset')) || firstCandidate(image.getAttribute('data-srcset')));
+}
+"""
+JAVASCRIPT_GET_CAROUSEL_IMAGES = JAVASCRIPT_IMAGE_SOURCE + """
+return Array.from(document.getElementsByClassName('athenaProductImageCarousel_image')).map(imageSource);
+"""
+JAVASCRIPT_GET_PRIMARY_IMAGE = JAVASCRIPT_IMAGE_SOURCE + """
+var image = document.getElementsByClassName('athenaProductImageCarousel_image')[0];
+return image ? imageSource(image) : null;
+"""
+JAVASCRIPT_GET_SWITCHED_VARIANT_IMAGE = JAVASCRIPT_IMAGE_SOURCE + """
+var oldPrice = arguments[0], seenImages = arguments[1];
+if (oldPrice && oldPrice.isConnected) { return null; }
+var image = document.getElementsByClassName('athenaProductImageCarousel_image')[0];
+var source = image ? imageSource(image) : null;
+return source && seenImages.indexOf(source) < 0 ? source : null;
+"""
+JAVASCRIPT_GET_SELECTED_OPTION = "return arguments[0].selectedIndex < 0 ? null : arguments[0].options[arguments[0].selectedIndex].textContent.trim();"
+JAVASCRIPT_MARK_PREVIOUS_PAGE = "window.cultBeautyPreviousPage = true;"
+JAVASCRIPT_START_NAVIGATION = "window.cultBeautyPreviousPage = true; window.location.href = arguments[0];"
+JAVASCRIPT_GET_NAVIGATION_RESULT = """
+if (window.cultBeautyPreviousPage || document.readyState === 'loading' || (arguments[0] && document.readyState !== 'complete')) { return null; }
+var navigation = performance.getEntriesByType('navigation')[0];
+return {status: navigation && navigation.responseStatus ? navigation.responseStatus : null, latency: navigation ? navigation.responseEnd / 1000 : null};
+"""
+JAVASCRIPT_PRODUCT_PAGE_READY = """
+if (window.cultBeautyPreviousPage || document.readyState === 'loading') { return false; }
+var image = document.getElementsByClassName('athenaProductImageCarousel_image')[0];
+var price = document.getElementsByClassName('productPrice_price')[0] || document.getElementsByClassName('productPrice_fromPrice')[0];
+return Boolean(image && (image.getAttribute('src') || image.getAttribute('data-src') || image.getAttribute('srcset')) && price);
+"""
+JAVASCRIPT_LISTING_PAGE_READY = """
+if (window.cultBeautyPreviousPage || document.readyState === 'loading') { return false; }
+return document.getElementsByClassName('productBlock_itemDetails_wrapper').length > 0 || document.readyState === 'complete';
+"""
+JAVASCRIPT_GET_NAVIGATION_STATUS = """
+var navigation = performance.getEntriesByType('navigation')[0];
+return navigation && navigation.responseStatus ? navigation.responseStatus : null;
+"""
+JAVASCRIPT_GET_LISTING_ITEMS = """
+return Array.from(document.getElementsByClassName('productBlock_itemDetails_wrapper')).map(function (item) {
+    function text(className) { var element = item.getElementsByClassName(className)[0]; return element ? element.textContent.trim() : null; }
+    var link = item.getElementsByClassName('productBlock_link')[0];
+    return {url: link ? link.href : null, name: text('productBlock_productName'), price: text('productBlock_priceValue')};
+});
+"""
+JAVASCRIPT_GET_VARIATION_FIELDS = """
+function first(className) { return document.getElementsByClassName(className)[0] || null; }
+var name = first('productName_title');
+var rating = first('productReviewStarsPresentational');
+var reviews = first('productReviewStars_numberOfReviews');
+var price = first('productPrice_price');
+return {
+    product_name: name ? name.textContent : null,
+    product_rating: rating ? rating.getAttribute('aria-label') : null,
+    number_of_reviews: reviews ? reviews.textContent : null,
+    price: price ? price.innerText : null,
+    sold_out: first('productAddToBasket-soldOut') !== null
+};
+"""
+NUM_OF_WORKERS = 10
+TABS_PER_WORKER = 3
+VARIANT_SWITCH_TIMEOUT_SEC = 10
+PRODUCT_TIME_BUDGET_SEC = 180
+WATCHDOG_GRACE_SEC = 30
+DRIVER_PROBE_TIMEOUT_SEC = 10
+MAX_CLICK_RETRIES = 5
+DRIVER_MAX_PAGES = 400
+DRIVER_MAX_RSS_MB = 1536
+USE_HTTP_FAST_PATH = False
+DISCOVER_LISTINGS_OVER_HTTP = True
+BULK_CAROUSEL_IMAGES = True
+HTTP_POOL_SIZE = 4
+HTTP_TIMEOUT_SEC = 15
+PRICE_JUNK_PATTERN = re.compile(r'[^\d.]')
+SHIPPING_RESTRICTION_PATTERN = re.compile(r'we regret.+(?:middle east|bahrain)', re.IGNORECASE)
+SHIPPING_REGRET_MESSAGE_PATTERN = re.compile(r'we regret we (?:can\'t|cannot) ship.+', re.IGNORECASE)
+RANGE_PATTERN = re.compile(r'range:\n+([a-z ]+)', re.IGNORECASE)
+EXCLUDED_VARIANTS_PATTERN = re.compile(r'refill|€', re.IGNORECASE)
+WORD_START_PATTERN = re.compile(r'(?:^|(?<= ))[^ ]')
+ENGLISH_WORD_PATTERN = re.compile(r"[a-z']+")
+ENGLISH_STOPWORDS = frozenset(['a', 'after', 'all', 'an', 'and', 'are', 'as', 'at', 'be', 'before', 'by', 'can', 'for', 'from', 'has',
+                               'have', 'in', 'into', 'is', 'it', 'its', 'not', 'of', 'on', 'or', 'our', 'that', 'the', 'then', 'this',
+                               'to', 'which', 'will', 'with', 'your', 'you'])
+ENGLISH_STOPWORD_RATIO = 0.2
+ENGLISH_MIN_WORDS = 4
+LANGUAGE_DETECTION_WORKERS = None
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv.gz'}
+EXCEL_MAX_ROWS = 1_048_575
+IMAGE_COLUMN_PATTERN = re.compile(r'product_image_(\d+)')
+# every other key of a scraped record is the heading of a description accordion
+PRODUCT_FIELDS = ['primary_SKU', 'product_url', 'brand_name', 'brand_logo']
+VARIANT_FIELDS = ['product_category', 'product_type', 'variant_SKU', 'product_name', 'product_rating', 'number_of_reviews', 'price',
+                  'in_stock', 'size', 'color', 'shade', 'option', 'color_hex', 'shade_hex', 'option_hex']
+CATEGORICAL_COLUMNS = {
+    'products': ['brand_name'],
+    'variants': ['product_category', 'product_type', 'in_stock', 'size', 'color', 'shade', 'option'],
+    'images': ['variant_SKU'],
+    'descriptions': ['primary_SKU', 'heading'],
+}
+LANGUAGE_DETECTION_MIN_PARALLEL = 64
+RESOURCE_BLOCKING = {'images': True, 'media': True, 'fonts': True, 'trackers': True}
+BLOCKED_URL_PATTERNS = {
+    'images': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*', '*.ogg*'],
+    'fonts': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'trackers': ['*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googleadservices.com*',
+                 '*connect.facebook.net*', '*hotjar.com*', '*criteo.com*', '*criteo.net*', '*bat.bing.com*', '*clarity.ms*',
+                 '*analytics.tiktok.com*', '*ct.pinterest.com*', '*sc-static.net*', '*taboola.com*', '*quantummetric.com*'],
+}
+
+
+def get_blocked_url_patterns(blocking_profile: dict[str, bool]):
+    """get the url patterns dropped by the browser for a resource blocking profile
+
+    Args:
+        blocking_profile (dict[str, bool]): resource groups of BLOCKED_URL_PATTERNS mapped to whether they are blocked
+
+    Returns:
+        list[str]: the url patterns in the format expected by Network.setBlockedURLs
+    """
+    return [pattern for group, blocked in blocking_profile.items() if blocked for pattern in BLOCKED_URL_PATTERNS[group]]
+
+
+def create_browser_options(blocking_profile: dict[str, bool] = None):
+    """create the chrome options used by every driver. Scripts are never blocked since the variant widgets depend on them.
+
+    Args:
+        blocking_profile (dict[str, bool], optional): resource groups to be blocked. Defaults to None (nothing is blocked).
+
+    Returns:
+        options.Options: the chrome options
+    """
+    browser_options = options.Options()
+    browser_options.page_load_strategy = PAGE_LOAD_STRATEGY
+    browser_options.add_argument('-disable-notifications')
+    browser_options.add_argument('-headless')
+    # background tabs keep loading and running their scripts at full speed when pages are prefetched
+    browser_options.add_argument('--disable-background-timer-throttling')
+    browser_options.add_argument('--disable-renderer-backgrounding')
+    browser_options.add_argument('--disable-backgrounding-occluded-windows')
+    if blocking_profile and blocking_profile.get('images'):
+        browser_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    return browser_options
+
+
+browser_options = create_browser_options(RESOURCE_BLOCKING)
+
+color_variation_tags = [x.casefold() for x in ['colour:', 'color:']]
+shade_variation_tags = [x.casefold() for x in ['shade:']]
+size_variation_tags = [x.casefold() for x in ['size:']]
+option_variation_tags = [x.casefold() for x in ['option:']]
+
+CATEGORY_LINKS = ['https://www.cultbeauty.com/body-wellbeing/tanning-suncare/shop-all.list',
+                'https://www.cultbeauty.com/skin-care.list',
+                'https://www.cultbeauty.com/make-up.list',
+                'https://www.cultbeauty.com/hair-care.list',
+                'https://www.cultbeauty.com/body-wellbeing.list',
+                'https://www.cultbeauty.com/fragrance.list',
+                'https://www.cultbeauty.com/gifts.list',
+                'https://www.cultbeauty.com/minis.list',
+                'https://www.cultbeauty.com/sale.list',
+                'https://www.cultbeauty.com/men.list']
+
 
 class ProductType:
     SINGLE = 'single'
@@ -71,6 +316,1066 @@ class ProductType:
     MULTI_SHADE = 'multi-shade'
     MULTI_OPTION = 'multi-option'
 
+http_pool = None
+rate_limiter = None
+tab_pool = None
+task_deadline = None
+stage_metrics = None
+pages_loaded = 0
+
+class TaskType:
+    LISTING = 'listing'
+    PRODUCT = 'product'
+
+class TaskOutcome:
+    SCRAPED = 'scraped'
+    UNCHANGED = 'unchanged'
+    DUPLICATE = 'duplicate'
+    FAILED = 'failed'
+
+class DeadlineExceededError(Exception):
+    """raised when the task being processed by a worker runs past its time budget"""
+
+class EmptyProductError(Exception):
+    """raised when a product page yields no records, e.g. its primary SKU could not be found before the page timed out"""
+
+class DuplicateProductError(Exception):
+    """raised when the primary SKU of a product page is already claimed by another product url
+
+    Args:
+        canonical_url (str): the product url owning the primary SKU
+    """
+
+    def __init__(self, canonical_url: str):
+        super().__init__(f'Product is a duplicate of "{canonical_url}".')
+        self.canonical_url = canonical_url
+
+class RecordSink:
+    """Append-only store of scraped sub variants. Records are kept as batches of dicts
+    and turned into a single data-frame only when needed, so appending never copies what was already scraped.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self._record_count = 0
+
+    def __len__(self):
+        return self._record_count
+
+    def append(self, records: list[dict[str, object]]):
+        """add a batch of records e.g. every sub variant of a product
+
+        Args:
+            records (list[dict[str, object]]): the records to be added
+        """
+        if records:
+            self.batches.append(records)
+            self._record_count += len(records)
+
+    def extend(self, other: 'RecordSink'):
+        """move every batch of another sink into this one without copying the records
+
+        Args:
+            other (RecordSink): the sink to take the batches from
+        """
+        self.batches.extend(other.batches)
+        self._record_count += len(other)
+
+    def get_columns(self):
+        """get every distinct record key in the order it first appears, the column order of to_dataframe
+
+        Returns:
+            list[str]: the record keys
+        """
+        return list(dict.fromkeys(itertools.chain.from_iterable(itertools.chain.from_iterable(self.batches))))
+
+    def to_dataframe(self):
+        """build a data-frame containing every record in the sink
+
+        Returns:
+            pd.DataFrame: the records with one column per distinct key
+        """
+        return pd.DataFrame(list(itertools.chain.from_iterable(self.batches)))
+
+    def to_tables(self):
+        """split the records into normalized tables instead of one sparse wide data-frame. Product fields and descriptions
+        are taken from the first record of every primary SKU and images from the first record of every variant SKU
+
+        Returns:
+            dict[str, pd.DataFrame]: products, variants (one row per record), images (variant_SKU, position, url)
+            and descriptions (primary_SKU, heading, text) with categorical dtypes for repeated strings
+        """
+        products = {}
+        variants = []
+        images = []
+        descriptions = []
+        seen_variants = set()
+        for record in itertools.chain.from_iterable(self.batches):
+            primary_sku = record.get('primary_SKU')
+            variant_sku = record.get('variant_SKU')
+            new_product = primary_sku not in products
+            new_variant = variant_sku not in seen_variants
+            if new_product:
+                products[primary_sku] = {field: record.get(field) for field in PRODUCT_FIELDS}
+            seen_variants.add(variant_sku)
+            variant = {'primary_SKU': primary_sku}
+            for key, value in record.items():
+                if key in PRODUCT_FIELDS:
+                    continue
+                if key in VARIANT_FIELDS:
+                    variant[key] = value
+                    continue
+                image = IMAGE_COLUMN_PATTERN.fullmatch(key)
+                if image is not None:
+                    if new_variant and value is not None:
+                        images.append((variant_sku, int(image.group(1)), value))
+                elif new_product and value is not None:
+                    descriptions.append((primary_sku, key, value))
+            variants.append(variant)
+        return to_categorical({
+            'products': pd.DataFrame(list(products.values()), columns=PRODUCT_FIELDS),
+            'variants': pd.DataFrame(variants),
+            'images': pd.DataFrame(images, columns=['variant_SKU', 'position', 'url']),
+            'descriptions': pd.DataFrame(descriptions, columns=['primary_SKU', 'heading', 'text']),
+        })
+
+class AdaptiveRateLimiter:
+    """Request pacer shared by every worker process using additive decrease / multiplicative increase of the interval between requests.
+
+    Every request reserves the next free slot on a shared timeline. Fast successful responses shrink the interval
+    down to the politeness budget, while slow responses, errors, 403 and 429 responses multiply it.
+
+    Args:
+        max_requests_per_sec (float): politeness budget across all workers, the interval never goes below its inverse
+        max_interval (float): the interval never goes above this many seconds
+        initial_interval (float): the interval used until responses are observed
+        target_latency (float): responses slower than this many seconds are treated as a sign of overload
+        decrease_step (float, optional): seconds removed from the interval after every healthy response. Defaults to 0.05.
+        increase_factor (float, optional): factor applied to the interval after every unhealthy response. Defaults to 2.
+    """
+    THROTTLE_STATUSES = {403, 429, 503}
+
+    def __init__(self, max_requests_per_sec: float, max_interval: float, initial_interval: float, target_latency: float,
+                 decrease_step = 0.05, increase_factor = 2.0):
+        self.min_interval = 1 / max_requests_per_sec
+        self.max_interval = max_interval
+        self.target_latency = target_latency
+        self.decrease_step = decrease_step
+        self.increase_factor = increase_factor
+        self._lock = multiprocessing.Lock()
+        self._interval = multiprocessing.Value('d', min(max(initial_interval, self.min_interval), max_interval), lock=False)
+        self._next_slot = multiprocessing.Value('d', 0.0, lock=False)
+
+    @property
+    def interval(self):
+        return self._interval.value
+
+    def acquire(self):
+        """block until the caller is allowed to send the next request"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self._interval.value
+        if slot > now:
+            time.sleep(slot - now)
+
+    def record(self, latency: float, status: int = None, error = False):
+        """adjust the interval based on the outcome of a request
+
+        Args:
+            latency (float): seconds the request took
+            status (int, optional): http status of the response if known. Defaults to None.
+            error (bool, optional): the request failed without a response e.g. timed out. Defaults to False.
+        """
+        throttled = error or status in self.THROTTLE_STATUSES or (status is not None and status >= 500)
+        with self._lock:
+            interval = self._interval.value
+            if throttled or latency > self.target_latency:
+                interval = min(self.max_interval, interval * self.increase_factor)
+                if throttled:
+                    # back off immediately instead of waiting for already reserved slots to pass
+                    self._next_slot.value = max(self._next_slot.value, time.monotonic() + interval)
+            else:
+                interval = max(self.min_interval, interval - self.decrease_step)
+            self._interval.value = interval
+        if throttled:
+            logger.warning('Request throttled or failed (status: %s). Request interval increased to %.2fs.', status, interval)
+
+def get_rate_limiter():
+    """get the rate limiter shared with the other workers, or a private one if this process was not started by scrape_categories
+
+    Returns:
+        AdaptiveRateLimiter: the rate limiter
+    """
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = create_rate_limiter()
+    return rate_limiter
+
+def create_rate_limiter():
+    """create a rate limiter from the module configuration
+
+    Returns:
+        AdaptiveRateLimiter: the rate limiter
+    """
+    return AdaptiveRateLimiter(RATE_LIMIT_MAX_REQUESTS_PER_SEC, RATE_LIMIT_MAX_INTERVAL_SEC, 
+                               RATE_LIMIT_INITIAL_INTERVAL_SEC, RATE_LIMIT_TARGET_LATENCY_SEC)
+
+class StageMetrics:
+    """Timing histograms and event counters of one process labelled by worker and by the category being scraped.
+    Workers publish their snapshot to the parent which merges and exports them.
+
+    Args:
+        worker (str, optional): label of the process. Defaults to 'main'.
+    """
+
+    def __init__(self, worker = 'main'):
+        self.worker = worker
+        self.category = None
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, stage: str, seconds: float):
+        """record the duration of a stage
+
+        Args:
+            stage (str): name of the stage e.g. page_load
+            seconds (float): the duration
+        """
+        histogram = self.histograms.get((stage, self.category))
+        if histogram is None:
+            histogram = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(METRICS_BUCKETS_SEC)}
+            self.histograms[(stage, self.category)] = histogram
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        histogram['max'] = max(histogram['max'], seconds)
+        for i, bound in enumerate(METRICS_BUCKETS_SEC):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+
+    def increment(self, event: str, amount = 1):
+        """count an event
+
+        Args:
+            event (str): name of the event e.g. stale_retry
+            amount (int, optional): the increment. Defaults to 1.
+        """
+        self.counters[(event, self.category)] = self.counters.get((event, self.category), 0) + amount
+
+    def snapshot(self):
+        """get the metrics as plain data that can be pickled or written as json
+
+        Returns:
+            dict[str, list[dict[str, object]]]: the histograms (with non cumulative bucket counts) and counters of this process
+        """
+        return {
+            'histograms': [{'stage': stage, 'worker': self.worker, 'category': category, **histogram, 'buckets': list(histogram['buckets'])}
+                           for (stage, category), histogram in self.histograms.items()],
+            'counters': [{'event': event, 'worker': self.worker, 'category': category, 'value': value}
+                         for (event, category), value in self.counters.items()],
+        }
+
+def get_stage_metrics():
+    """get the metrics of this process
+
+    Returns:
+        StageMetrics: the metrics
+    """
+    global stage_metrics
+    if stage_metrics is None:
+        stage_metrics = StageMetrics()
+    return stage_metrics
+
+def timed_stage(stage: str):
+    """decorator recording the wall time of every call of a function in the metrics of the calling process
+
+    Args:
+        stage (str): name of the stage the function is recorded as
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                get_stage_metrics().observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def start_driver(browser_options: options.Options, blocking_profile: dict[str, bool] = None):
+    """start a chrome driver and block the resources of the given profile through the devtools protocol
+
+    Args:
+        browser_options (options.Options): options to be used by the chrome webdriver
+        blocking_profile (dict[str, bool], optional): resource groups to be blocked. Defaults to None (RESOURCE_BLOCKING).
+
+    Returns:
+        webdriver.WebDriver: the started driver
+    """
+    wd = webdriver.WebDriver(browser_options)
+    block_resources(wd, blocking_profile)
+    return wd
+
+def get_descendant_processes(pid: int):
+    """get the ids of every descendant of a process using /proc
+
+    Args:
+        pid (int): id of the root process
+
+    Returns:
+        list[int]: ids of the descendants, empty if /proc is not available
+    """
+    descendants = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as children:
+                    pending.extend(int(x) for x in children.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+        if current != pid:
+            descendants.append(current)
+    return descendants
+
+def kill_driver(wd: webdriver.WebDriver):
+    """kill chromedriver and every chrome process it started, making any blocked call on the driver fail
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be killed
+    """
+    process = getattr(getattr(wd, 'service', None), 'process', None)
+    if process is None:
+        return
+    for pid in get_descendant_processes(process.pid):
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except (ProcessLookupError, PermissionError):
+            continue
+    process.kill()
+
+def get_process_tree_rss(pid: int):
+    """sum the resident memory of a process and all of its descendants using psutil, or /proc when it is not installed
+
+    Args:
+        pid (int): id of the root process
+
+    Returns:
+        int: resident set size in bytes, 0 if the process is gone or neither psutil nor /proc is available
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root, *root.children(recursive=True)]
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+    total = 0
+    for current in [pid, *get_descendant_processes(pid)]:
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+def get_driver_rss(wd: webdriver.WebDriver):
+    """get the resident memory of chromedriver and every chrome process it started
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be measured
+
+    Returns:
+        int: resident set size in bytes, 0 if the driver process is not known
+    """
+    process = getattr(getattr(wd, 'service', None), 'process', None)
+    if process is None:
+        return 0
+    return get_process_tree_rss(process.pid)
+
+def get_recycle_reason(wd: webdriver.WebDriver):
+    """check the driver against DRIVER_MAX_PAGES and DRIVER_MAX_RSS_MB, a limit set to None is not checked
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be checked
+
+    Returns:
+        str | None: why the driver should be recycled, None while it is within both limits
+    """
+    if DRIVER_MAX_PAGES and pages_loaded >= DRIVER_MAX_PAGES:
+        return f'{pages_loaded} pages'
+    if DRIVER_MAX_RSS_MB:
+        rss = get_driver_rss(wd) / 2**20
+        if rss >= DRIVER_MAX_RSS_MB:
+            return f'reaching {rss:.0f} MB of resident memory after {pages_loaded} pages'
+    return None
+
+def block_resources(wd: webdriver.WebDriver, blocking_profile: dict[str, bool] = None):
+    """block the resources of the given profile in the current tab of the driver through the devtools protocol
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be updated
+        blocking_profile (dict[str, bool], optional): resource groups to be blocked. Defaults to None (RESOURCE_BLOCKING).
+    """
+    patterns = get_blocked_url_patterns(RESOURCE_BLOCKING if blocking_profile is None else blocking_profile)
+    if not patterns:
+        return
+    try:
+        wd.execute_cdp_cmd('Network.enable', {})
+        wd.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    except WebDriverException:
+        logger.warning('Could not set blocked urls. Pages will be loaded with all of their resources.', exc_info=True)
+
+
+def get_navigation_status(wd: webdriver.WebDriver):
+    """get the http status of the last page loaded by the driver
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+
+    Returns:
+        int | None: the http status or None if the browser does not expose it
+    """
+    try:
+        status = wd.execute_script(JAVASCRIPT_GET_NAVIGATION_STATUS)
+    except WebDriverException:
+        return None
+    return status or None
+
+@timed_stage('page_load')
+def load_page(wd: webdriver.WebDriver, url: str):
+    """load a page once the rate limiter allows it and report the outcome back to the rate limiter
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+        url (str): the page to be loaded
+
+    Returns:
+        int | None: the http status of the page or None if the browser does not expose it
+    """
+    global pages_loaded
+    if tab_pool is not None and tab_pool.activate(url):
+        status = tab_pool.wait_for_navigation()
+        if status is not False:
+            return status
+        logger.warning('Prefetched page "%s" did not finish loading. Loading it again...', url)
+    if PAGE_LOAD_STRATEGY == 'none':
+        try:
+            wd.execute_script(JAVASCRIPT_MARK_PREVIOUS_PAGE)
+        except WebDriverException:
+            pass
+    limiter = get_rate_limiter()
+    limiter.acquire()
+    pages_loaded += 1
+    start = time.monotonic()
+    try:
+        wd.get(url)
+    except WebDriverException:
+        limiter.record(time.monotonic() - start, error=True)
+        raise
+    latency = time.monotonic() - start
+    status = get_navigation_status(wd)
+    limiter.record(latency, status)
+    return status
+
+@timed_stage('page_ready')
+def wait_for_page_ready(wd: webdriver.WebDriver, probe: str, timeout: float = None):
+    """poll a readiness probe of the loaded page. With the eager/none page load strategy this is the only wait a page
+    pays for, every lookup done afterwards is expected to find its element immediately or treat it as missing.
+    The probes also wait for the document to be parsed since 'none' returns while the html is still streaming
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+        probe (str): javascript returning true once the page can be scraped
+        timeout (float, optional): max wait time before timing out. Defaults to None (PAGE_READY_TIMEOUT_SEC).
+
+    Returns:
+        bool: True if the page became ready before timing out
+    """
+    timeout = PAGE_READY_TIMEOUT_SEC if timeout is None else timeout
+    try:
+        WebDriverWait(wd, timeout, poll_frequency=0.05).until(lambda driver: driver.execute_script(probe))
+    except TimeoutException:
+        get_stage_metrics().increment('page_ready_timeout')
+        logger.warning('Page "%s" was not ready after %s seconds.', wd.current_url, timeout)
+        return False
+    return True
+
+def wait_for_variant_switch(wd: webdriver.WebDriver, old_price: WebElement, seen_images: set[str], timeout: float = None):
+    """wait for the page to show a new sub variant after clicking it: the old price element is replaced and the first
+    carousel image is one no previous sub variant had
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+        old_price (WebElement): the price element before the click, None to only wait for the image
+        seen_images (set[str]): first carousel images of the sub variants scraped so far
+        timeout (float, optional): max wait time before timing out. Defaults to None (VARIANT_SWITCH_TIMEOUT_SEC).
+
+    Returns:
+        bool: True if the sub variant switched before timing out
+    """
+    timeout = VARIANT_SWITCH_TIMEOUT_SEC if timeout is None else timeout
+    seen_images = list(seen_images)
+
+    def switched(driver: webdriver.WebDriver):
+        nonlocal old_price
+        try:
+            return driver.execute_script(JAVASCRIPT_GET_SWITCHED_VARIANT_IMAGE, old_price, seen_images)
+        except StaleElementReferenceException:
+            # the old price was already replaced, only the image is left to wait for
+            old_price = None
+            return False
+
+    try:
+        WebDriverWait(wd, timeout, poll_frequency=0.05).until(switched)
+    except TimeoutException:
+        get_stage_metrics().increment('variant_switch_timeout')
+        return False
+    return True
+
+def is_new_variation(variation_details: dict[str, object], seen_images: set[str]):
+    """check that a sub variant has a first carousel image not shared with a previous sub variant and index it
+
+    Args:
+        variation_details (dict[str, object]): the sub variant with its carousel images
+        seen_images (set[str]): first carousel images of the sub variants scraped so far, updated in place
+
+    Returns:
+        bool: True if the sub variant should be kept
+    """
+    primary_image = variation_details.get('product_image_1')
+    if not primary_image:
+        logger.error('Could not find primary image from URL: "%s". Variation: "%s". Skipping variation...', 
+                     variation_details['product_url'], get_variation_name(variation_details))
+        return False
+    if primary_image in seen_images:
+        logger.warning('Variation image in URL: "%s", variation: "%s" is duplicated. Skipping variation...', 
+                       variation_details['product_url'], get_variation_name(variation_details))
+        return False
+    seen_images.add(primary_image)
+    return True
+
+def check_deadline():
+    """raise if the task being processed by this worker ran past its time budget, called from every loop that waits on the page
+
+    Raises:
+        DeadlineExceededError: the time budget is spent
+    """
+    if task_deadline is not None and time.monotonic() > task_deadline:
+        raise DeadlineExceededError(f'Task ran past its time budget of {PRODUCT_TIME_BUDGET_SEC} seconds.')
+
+class DriverWatchdog(threading.Thread):
+    """Background thread enforcing the time budget of the task a worker is processing. The worker loops give up on their own
+    through check_deadline, a driver call still blocked WATCHDOG_GRACE_SEC after the deadline is aborted by killing the driver.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.fired = False
+        self._lock = threading.Lock()
+        self._wd = None
+        self._kill_at = None
+        self._stop_event = threading.Event()
+
+    def arm(self, wd: webdriver.WebDriver, budget: float = None, grace: float = None):
+        """start the time budget of a task
+
+        Args:
+            wd (webdriver.WebDriver): the driver used by the task
+            budget (float, optional): seconds the task may take. Defaults to None (PRODUCT_TIME_BUDGET_SEC).
+            grace (float, optional): seconds a blocked driver call may outlive the budget. Defaults to None (WATCHDOG_GRACE_SEC).
+        """
+        global task_deadline
+        task_deadline = time.monotonic() + (PRODUCT_TIME_BUDGET_SEC if budget is None else budget)
+        with self._lock:
+            self.fired = False
+            self._wd = wd
+            self._kill_at = task_deadline + (WATCHDOG_GRACE_SEC if grace is None else grace)
+
+    def disarm(self):
+        global task_deadline
+        task_deadline = None
+        with self._lock:
+            self._wd = None
+            self._kill_at = None
+
+    def run(self):
+        while not self._stop_event.wait(1):
+            with self._lock:
+                if self._kill_at is None or time.monotonic() < self._kill_at:
+                    continue
+                logger.error('Driver is still blocked past the task deadline. Killing it...')
+                self.fired = True
+                self._kill_at = None
+                try:
+                    kill_driver(self._wd)
+                except Exception:
+                    logger.exception('Could not kill the driver.')
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def is_driver_responsive(wd: webdriver.WebDriver, watchdog: DriverWatchdog):
+    """check that a driver still answers commands within DRIVER_PROBE_TIMEOUT_SEC
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be checked
+        watchdog (DriverWatchdog): the watchdog killing the driver if the probe blocks
+
+    Returns:
+        bool: True if the driver answered
+    """
+    watchdog.arm(wd, DRIVER_PROBE_TIMEOUT_SEC, 0)
+    try:
+        wd.execute_script('return 1;')
+        return not watchdog.fired
+    except Exception:
+        return False
+    finally:
+        watchdog.disarm()
+
+class TabPool:
+    """Rotates the scraping of a driver over several tabs. Product pages are prefetched in the free tabs while the
+    current tab is being extracted so the network wait of the next products overlaps with the DOM work of this one.
+    load_page switches to the tab of a prefetched url instead of loading it again.
+
+    Args:
+        wd (webdriver.WebDriver): the driver owning the tabs
+        size (int): total number of tabs including the current one
+        blocking_profile (dict[str, bool], optional): resource groups blocked in the new tabs. Defaults to None (RESOURCE_BLOCKING).
+    """
+
+    def __init__(self, wd: webdriver.WebDriver, size: int, blocking_profile: dict[str, bool] = None):
+        self.wd = wd
+        self.handles = [wd.current_window_handle]
+        for _ in range(size - 1):
+            wd.switch_to.new_window('tab')
+            block_resources(wd, blocking_profile)
+            self.handles.append(wd.current_window_handle)
+        self.current = self.handles[0]
+        self.focused = self.handles[-1]
+        self.prefetched = {}
+
+    def focus(self, handle: str):
+        if handle != self.focused:
+            self.wd.switch_to.window(handle)
+            self.focused = handle
+
+    def prefetch(self, urls: list[str]):
+        """start loading urls in the free tabs without waiting for them, urls that do not fit are skipped
+
+        Args:
+            urls (list[str]): the upcoming product urls in the order they will be scraped
+        """
+        global pages_loaded
+        for url in urls:
+            if url in self.prefetched:
+                continue
+            busy = set(self.prefetched.values())
+            free = [handle for handle in self.handles if handle != self.current and handle not in busy]
+            if not free:
+                return
+            limiter = get_rate_limiter()
+            limiter.acquire()
+            try:
+                self.focus(free[0])
+                self.wd.execute_script(JAVASCRIPT_START_NAVIGATION, url)
+            except WebDriverException:
+                limiter.record(0, error=True)
+                logger.warning('Could not prefetch "%s".', url, exc_info=True)
+                continue
+            pages_loaded += 1
+            self.prefetched[url] = free[0]
+
+    def activate(self, url: str):
+        """make the tab of a prefetched url the current tab, otherwise switch back to the current tab
+
+        Args:
+            url (str): the page about to be loaded
+
+        Returns:
+            bool: True if the url was prefetched and its tab is now current
+        """
+        handle = self.prefetched.pop(url, None)
+        if handle is not None:
+            self.current = handle
+        self.focus(self.current)
+        return handle is not None
+
+    def wait_for_navigation(self):
+        """wait for the prefetched page of the current tab and report its outcome to the rate limiter
+
+        Returns:
+            int | None | bool: the http status of the page, None if the browser does not expose it
+            or False if the page did not load before PAGE_READY_TIMEOUT_SEC
+        """
+        try:
+            result = WebDriverWait(self.wd, PAGE_READY_TIMEOUT_SEC, poll_frequency=0.05).until(
+                lambda driver: driver.execute_script(JAVASCRIPT_GET_NAVIGATION_RESULT, PAGE_LOAD_STRATEGY == 'normal'))
+        except TimeoutException:
+            get_rate_limiter().record(PAGE_READY_TIMEOUT_SEC, error=True)
+            get_stage_metrics().increment('prefetch_timeout')
+            return False
+        get_rate_limiter().record(result['latency'] or 0, result['status'])
+        return result['status']
+
+    def discard(self, url: str):
+        """free the tab of a prefetched url that is not going to be loaded"""
+        self.prefetched.pop(url, None)
+
+def http_request(url: str, headers: dict[str, str], method = 'GET'):
+    """send a pooled http request once the rate limiter allows it and report the outcome back to the rate limiter
+
+    Args:
+        url (str): the url to be requested
+        headers (dict[str, str]): the request headers
+        method (str, optional): the http method. Defaults to 'GET'.
+
+    Returns:
+        urllib3.BaseHTTPResponse: the response
+    """
+    limiter = get_rate_limiter()
+    limiter.acquire()
+    start = time.monotonic()
+    try:
+        response = get_http_pool().request(method, url, headers=headers)
+    except urllib3.exceptions.HTTPError:
+        limiter.record(time.monotonic() - start, error=True)
+        raise
+    limiter.record(time.monotonic() - start, response.status)
+    return response
+
+def init_worker(tqdm_lock, limiter: AdaptiveRateLimiter, queue = None, level: str = None):
+    """initializer of the worker processes, shares the progress bar lock, the rate limiter and the log queue with the parent
+
+    Args:
+        tqdm_lock (multiprocessing.RLock): the lock used by tqdm for writing progress bars
+        limiter (AdaptiveRateLimiter): the rate limiter shared by all workers
+        queue (multiprocessing.Queue, optional): the log queue of the parent, None to keep the inherited handlers. Defaults to None.
+        level (str, optional): the logging level of the parent. Defaults to None (LOGGING_LEVEL).
+    """
+    global rate_limiter
+    tqdm.set_lock(tqdm_lock)
+    rate_limiter = limiter
+    if queue is not None:
+        attach_queue_handler(queue, level)
+
+def get_product_key(url: str):
+    """get the key identifying a product url regardless of its query string, fragment or trailing slash
+
+    Args:
+        url (str): link to the product page
+
+    Returns:
+        str: the normalized url e.g. www.cultbeauty.com/p/some-product/11373633
+    """
+    parts = urlsplit(url)
+    return f'{parts.netloc.lower()}{parts.path.rstrip("/")}'
+
+class CheckpointStore:
+    """SQLite store persisting every scraped product and every processed listing page as soon as they are done,
+    so a crashed crawl can be resumed without scraping them again. It also keeps a snapshot of the last finished run
+    used by the incremental mode and the detected language of every cleaned text. Every process opens its own connection on first use.
+    Product urls and primary SKUs are claimed by the first worker reaching them, so products listed in several categories
+    are only scraped once and their other categories are recorded as memberships.
+
+    Args:
+        path (str): location of the sqlite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = None
+
+    def __getstate__(self):
+        return {'path': self.path, '_connection': None}
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+        return self._connection
+
+    def initialize(self, reset = False):
+        """create the tables if missing
+
+        Args:
+            reset (bool, optional): remove the progress of a previous run. The snapshot and the language cache are kept. Defaults to False.
+        """
+        if reset:
+            self.connection.execute('DROP TABLE IF EXISTS products')
+            self.connection.execute('DROP TABLE IF EXISTS listing_pages')
+            self.connection.execute('DROP TABLE IF EXISTS product_claims')
+            self.connection.execute('DROP TABLE IF EXISTS sku_claims')
+            self.connection.execute('DROP TABLE IF EXISTS memberships')
+            self.connection.execute('DROP TABLE IF EXISTS failed_products')
+            self.connection.execute('DROP TABLE IF EXISTS failed_listing_pages')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS products (product_url TEXT, category TEXT, primary_SKU TEXT, records TEXT, '
+                                'fingerprint TEXT, etag TEXT, last_modified TEXT, scraped_at REAL, PRIMARY KEY (product_url, category))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS listing_pages (category_url TEXT, page INTEGER, last_page INTEGER, '
+                                'products TEXT, scraped_at REAL, PRIMARY KEY (category_url, page))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS snapshot (product_url TEXT PRIMARY KEY, primary_SKU TEXT, records TEXT, '
+                                'fingerprint TEXT, etag TEXT, last_modified TEXT, scraped_at REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS snapshot_primary_sku ON snapshot (primary_SKU)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS languages (text_hash TEXT PRIMARY KEY, language TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS product_claims (product_key TEXT PRIMARY KEY, product_url TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS sku_claims (primary_SKU TEXT PRIMARY KEY, product_url TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS memberships (product_url TEXT, category TEXT, canonical_url TEXT, '
+                                'recorded_at REAL, PRIMARY KEY (product_url, category))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS failed_products (product_url TEXT, category TEXT, reason TEXT, failed_at REAL, '
+                                'PRIMARY KEY (product_url, category))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS failed_listing_pages (category_url TEXT, page INTEGER, reason TEXT, failed_at REAL, '
+                                'PRIMARY KEY (category_url, page))')
+        # claims of products that were in flight when a previous run stopped would hide them forever
+        self.connection.execute('DELETE FROM product_claims WHERE product_url NOT IN (SELECT product_url FROM products)')
+        self.connection.execute('DELETE FROM sku_claims WHERE product_url NOT IN (SELECT product_url FROM products)')
+        self.connection.execute('DELETE FROM memberships WHERE canonical_url NOT IN (SELECT product_url FROM products)')
+
+    def claim_product(self, product_url: str):
+        """atomically claim a product url for the calling worker
+
+        Args:
+            product_url (str): link to the product page
+
+        Returns:
+            str | None: None if the claim succeeded, otherwise the url that claimed the product first
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        cursor = self.connection.execute('INSERT OR IGNORE INTO product_claims VALUES (?, ?)', (get_product_key(product_url), product_url))
+        owner = None if cursor.rowcount == 1 else self.connection.execute(
+            'SELECT product_url FROM product_claims WHERE product_key = ?', (get_product_key(product_url),)).fetchone()[0]
+        self.connection.execute('COMMIT')
+        return owner
+
+    def claim_sku(self, primary_sku: str, product_url: str):
+        """atomically claim a primary SKU for a product url
+
+        Args:
+            primary_sku (str): primary SKU of the product
+            product_url (str): link to the product page
+
+        Returns:
+            str | None: None if the SKU is owned by product_url, otherwise the url owning the SKU
+        """
+        self.connection.execute('BEGIN IMMEDIATE')
+        self.connection.execute('INSERT OR IGNORE INTO sku_claims VALUES (?, ?)', (primary_sku, product_url))
+        owner = self.connection.execute('SELECT product_url FROM sku_claims WHERE primary_SKU = ?', (primary_sku,)).fetchone()[0]
+        self.connection.execute('COMMIT')
+        return None if owner == product_url else owner
+
+    def redirect_product(self, product_url: str, canonical_url: str):
+        """point the claim of a product url to the url owning its primary SKU, so later listings of it are recorded as memberships
+        of the canonical url"""
+        self.connection.execute('UPDATE product_claims SET product_url = ? WHERE product_key = ?', (canonical_url, get_product_key(product_url)))
+
+    def release_product(self, product_url: str):
+        """drop the claims of a product that could not be scraped so it can be claimed again. The urls redirected to it are
+        released too and the memberships sharing its sub variants are recorded as failed products, so resuming retries them"""
+        self.connection.execute('BEGIN IMMEDIATE')
+        self.connection.execute('DELETE FROM product_claims WHERE product_key = ? OR product_url = ?', (get_product_key(product_url), product_url))
+        self.connection.execute('DELETE FROM sku_claims WHERE product_url = ?', (product_url,))
+        self.connection.execute('INSERT OR REPLACE INTO failed_products SELECT product_url, category, ?, ? FROM memberships WHERE canonical_url = ?',
+                                (f'Canonical product "{product_url}" could not be scraped.', time.time(), product_url))
+        self.connection.execute('DELETE FROM memberships WHERE canonical_url = ?', (product_url,))
+        self.connection.execute('COMMIT')
+
+    def get_claimed_products(self, product_urls: list[str]):
+        """get which of the given product urls are already claimed
+
+        Args:
+            product_urls (list[str]): links to product pages
+
+        Returns:
+            set[str]: the claimed urls
+        """
+        keys = {get_product_key(url): url for url in product_urls}
+        claimed = self.connection.execute(f'SELECT product_key FROM product_claims WHERE product_key IN ({",".join("?" * len(keys))})', 
+                                          list(keys))
+        return {keys[key] for (key,) in claimed}
+
+    def save_membership(self, product_url: str, category: str, canonical_url: str):
+        """record that a product is also listed in a category without storing its sub variants again
+
+        Args:
+            product_url (str): link to the product page as found in the listing
+            category (str): the category the product was found in
+            canonical_url (str): the product url whose stored sub variants are shared
+        """
+        self.connection.execute('INSERT OR REPLACE INTO memberships VALUES (?, ?, ?, ?)', (product_url, category, canonical_url, time.time()))
+
+    def save_product(self, product_url: str, category: str, records: list[dict[str, object]], fingerprint: str = None, 
+                     validators: dict[str, str] = None):
+        """persist every sub variant of a product
+
+        Args:
+            product_url (str): link to the product page
+            category (str): the category the product was scraped from
+            records (list[dict[str, object]]): the sub variants of the product
+            fingerprint (str, optional): fingerprint of the product in the listing page. Defaults to None.
+            validators (dict[str, str], optional): etag and last_modified http validators of the product page. Defaults to None.
+        """
+        validators = validators or {}
+        primary_sku = records[0].get('primary_SKU') if records else None
+        self.connection.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?)', 
+                                (product_url, category, primary_sku, json.dumps(records), fingerprint, 
+                                 validators.get('etag'), validators.get('last_modified'), time.time()))
+
+    def save_listing_page(self, category_url: str, page: int, last_page: int, products: list[dict[str, str]]):
+        """mark a listing page as processed
+
+        Args:
+            category_url (str): link to the category listing
+            page (int): the page number
+            last_page (int): the number of pages of the category, only meaningful for the first page
+            products (list[dict[str, str]]): url and fingerprint of the products found in the page
+        """
+        self.connection.execute('INSERT OR REPLACE INTO listing_pages VALUES (?, ?, ?, ?, ?)', 
+                                (category_url, page, last_page, json.dumps(products), time.time()))
+
+    def save_failed_product(self, product_url: str, category: str, reason: str):
+        """record a product that could not be scraped. It is not marked as scraped, so resuming retries it
+
+        Args:
+            product_url (str): link to the product page
+            category (str): the category the product was found in
+            reason (str): why the product failed e.g. the exception message
+        """
+        self.connection.execute('INSERT OR REPLACE INTO failed_products VALUES (?, ?, ?, ?)', (product_url, category, reason, time.time()))
+
+    def get_failed_products(self):
+        """get every recorded failure of a product that was not scraped since
+
+        Returns:
+            list[tuple[str, str, str]]: (product url, category, reason) of every failed product
+        """
+        return self.connection.execute('SELECT product_url, category, reason FROM failed_products f WHERE NOT EXISTS '
+                                       '(SELECT 1 FROM products p WHERE p.product_url = f.product_url AND p.category = f.category) '
+                                       'AND NOT EXISTS (SELECT 1 FROM memberships m WHERE m.product_url = f.product_url AND m.category = f.category) '
+                                       'ORDER BY failed_at').fetchall()
+
+    def save_failed_listing_page(self, category_url: str, page: int, reason: str):
+        """record a listing page that could not be processed. It is not marked as processed, so resuming loads it again
+
+        Args:
+            category_url (str): link to the category listing
+            page (int): the page number
+            reason (str): why the page failed e.g. the exception message
+        """
+        self.connection.execute('INSERT OR REPLACE INTO failed_listing_pages VALUES (?, ?, ?, ?)', (category_url, page, reason, time.time()))
+
+    def get_failed_listing_pages(self):
+        """get every recorded failure of a listing page that was not processed since
+
+        Returns:
+            list[tuple[str, int, str]]: (category url, page, reason) of every failed listing page
+        """
+        return self.connection.execute('SELECT category_url, page, reason FROM failed_listing_pages f WHERE NOT EXISTS '
+                                       '(SELECT 1 FROM listing_pages l WHERE l.category_url = f.category_url AND l.page = f.page) '
+                                       'ORDER BY failed_at').fetchall()
+
+    def get_listing_pages(self):
+        """get every processed listing page
+
+        Returns:
+            dict[tuple[str, int], tuple[int, list[dict[str, str]]]]: (last page, products) keyed by (category url, page)
+        """
+        return {(url, page): (last_page, json.loads(products)) for url, page, last_page, products
+                in self.connection.execute('SELECT category_url, page, last_page, products FROM listing_pages')}
+
+    def get_scraped_products(self):
+        """get every product that was already scraped
+
+        Returns:
+            set[tuple[str, str]]: (product url, category) of every scraped product with records, including recorded memberships
+        """
+        return set(self.connection.execute("SELECT product_url, category FROM products WHERE records != '[]' "
+                                           'UNION SELECT product_url, category FROM memberships'))
+
+    def get_snapshot(self, product_url: str):
+        """get a product as it was scraped in the last finished run
+
+        Args:
+            product_url (str): link to the product page
+
+        Returns:
+            dict[str, object] | None: primary_SKU, records, fingerprint, etag and last_modified of the product or None if not found
+        """
+        row = self.connection.execute('SELECT primary_SKU, records, fingerprint, etag, last_modified FROM snapshot WHERE product_url = ?', 
+                                      (product_url,)).fetchone()
+        if row is None:
+            return None
+        return {'primary_SKU': row[0], 'records': json.loads(row[1]), 'fingerprint': row[2], 'etag': row[3], 'last_modified': row[4]}
+
+    def update_snapshot(self):
+        """replace the snapshot with the products scraped in this run"""
+        self.connection.execute('BEGIN')
+        self.connection.execute('DELETE FROM snapshot')
+        self.connection.execute("INSERT OR REPLACE INTO snapshot SELECT product_url, primary_SKU, records, fingerprint, etag, last_modified, "
+                                "scraped_at FROM products WHERE records != '[]'")
+        self.connection.execute('COMMIT')
+
+    def get_languages(self, text_hashes: list[str]):
+        """get the cached languages of texts
+
+        Args:
+            text_hashes (list[str]): hashes of the texts as returned by get_text_hash
+
+        Returns:
+            dict[str, str]: language keyed by text hash, texts that were never detected are missing
+        """
+        languages = {}
+        for start in range(0, len(text_hashes), 500):
+            chunk = text_hashes[start:start + 500]
+            languages.update(self.connection.execute(f'SELECT text_hash, language FROM languages WHERE text_hash IN ({",".join("?" * len(chunk))})',
+                                                     chunk))
+        return languages
+
+    def save_languages(self, languages: dict[str, str]):
+        """cache the detected languages of texts
+
+        Args:
+            languages (dict[str, str]): language keyed by text hash
+        """
+        self.connection.execute('BEGIN')
+        self.connection.executemany('INSERT OR REPLACE INTO languages VALUES (?, ?)', languages.items())
+        self.connection.execute('COMMIT')
+
+    def to_sink(self):
+        """load every stored sub variant. Products recorded as memberships of other categories get a copy
+        of the sub variants of their canonical url with their own category
+
+        Returns:
+            RecordSink: the stored sub variants in scraping order followed by the memberships in recording order
+        """
+        sink = RecordSink()
+        for (records,) in self.connection.execute('SELECT records FROM products ORDER BY scraped_at'):
+            sink.append(json.loads(records))
+        memberships = self.connection.execute('SELECT m.product_url, m.category, p.records FROM memberships m JOIN products p ON p.rowid = '
+                                              '(SELECT rowid FROM products WHERE product_url = m.canonical_url LIMIT 1) ORDER BY m.recorded_at')
+        for product_url, category, records in memberships:
+            sink.append([{**record, 'product_url': product_url, 'product_category': category} for record in json.loads(records)])
+        return sink
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
 def safe_get_element(wd: webdriver.WebDriver, by: By, value:str):
     """get element from DOM without throwing exceptions if not present
 
@@ -88,26 +1393,91 @@ def safe_get_element(wd: webdriver.WebDriver, by: By, value:str):
     except NoSuchElementException:
         return None
 
-def confirm_language(text: str, target = 'en'):
-    """confirm the language of given text matches target
+def get_text_hash(text: str):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def detect_language(text: str):
+    """detect the language of a text
 
     Args:
         text (str): text to be tested
-        target (str, optional): target language. Defaults to 'en'.
 
     Returns:
-        str | pd.NA: the text if language matches target, pd.NA otherwise
+        str | None: the language code or None if it could not be detected
     """
-    if pd.isna(text):
-        return text
     try:
-        detector = detect(text)
+        return detect(text)
     except Exception:
-        logger.error(f'An error has occurred while confirming language of text:\n "{text}". returning pd.NA')
-        return pd.NA
-    if detector != target:
-        return pd.NA
-    return text
+        logger.error('An error has occurred while detecting language of text:\n "%s".', text)
+        return None
+
+def looks_english(text: str):
+    """cheap check for obviously english text: plain ascii made of enough common english words
+
+    Args:
+        text (str): text to be tested
+
+    Returns:
+        bool: True if the text is obviously english, False if it has to go through language detection
+    """
+    if not text.isascii():
+        return False
+    words = ENGLISH_WORD_PATTERN.findall(text.lower())
+    if len(words) < ENGLISH_MIN_WORDS:
+        return False
+    return sum(word in ENGLISH_STOPWORDS for word in words) / len(words) >= ENGLISH_STOPWORD_RATIO
+
+def detect_languages(texts: list[str], store: CheckpointStore = None):
+    """detect the language of unique texts. Cached results are reused, obviously english texts are not detected
+    and the remaining texts are spread over a process pool
+
+    Args:
+        texts (list[str]): unique texts to be detected
+        store (CheckpointStore, optional): store used as a persistent cache. Defaults to None.
+
+    Returns:
+        dict[str, str | None]: language keyed by text, None if it could not be detected
+    """
+    hashes = {text: get_text_hash(text) for text in texts}
+    cached = store.get_languages(list(hashes.values())) if store is not None else {}
+    languages = {}
+    pending = []
+    for text, text_hash in hashes.items():
+        if text_hash in cached:
+            languages[text] = cached[text_hash]
+        elif looks_english(text):
+            languages[text] = 'en'
+        else:
+            pending.append(text)
+    logger.info('Detecting languages of %d texts: %d cached, %d obviously english, %d to detect.', len(texts), 
+                len(cached), len(texts) - len(cached) - len(pending), len(pending))
+    if len(pending) < LANGUAGE_DETECTION_MIN_PARALLEL:
+        detected = map(detect_language, pending)
+    else:
+        workers = LANGUAGE_DETECTION_WORKERS or os.cpu_count()
+        initargs = (log_queue, logging.getLevelName(logger.level)) if log_queue is not None else ()
+        with ProcessPoolExecutor(workers, initializer=attach_queue_handler if initargs else None, initargs=initargs) as executor:
+            detected = list(executor.map(detect_language, pending, chunksize=max(1, len(pending) // (workers * 4))))
+    languages.update(zip(pending, detected))
+    if store is not None:
+        store.save_languages({hashes[text]: language for text, language in languages.items()
+                              if language is not None and hashes[text] not in cached})
+    return languages
+
+def filter_language(column: pd.Series, target = 'en', store: CheckpointStore = None):
+    """replace every text of a column that is not in the target language with NA. Each unique text is detected once
+
+    Args:
+        column (pd.Series): the texts to be filtered
+        target (str, optional): target language. Defaults to 'en'.
+        store (CheckpointStore, optional): store used as a persistent cache of detected languages. Defaults to None.
+
+    Returns:
+        pd.Series: the filtered column
+    """
+    languages = detect_languages(column.dropna().unique().tolist(), store)
+    keep = column.isna() | (column.map(languages) == target)
+    return column.where(keep, pd.NA)
 
 def change_currency(wd: webdriver.WebDriver, to = '£ (GBP)'):
     """change the selected currency in on the website
@@ -135,14 +1505,17 @@ def change_currency(wd: webdriver.WebDriver, to = '£ (GBP)'):
             logger.fatal('Could not locate save button to change currency.')
             return False
         click_element_refresh_stale(wd, save_button, By.CLASS_NAME, 'sessionSettings_saveButton')
-        time.sleep(2)
+        try:
+            WebDriverWait(wd, CURRENCY_CHANGE_TIMEOUT_SEC).until(EC.staleness_of(save_button))
+        except TimeoutException:
+            logger.debug('Page was not reloaded after saving currency settings.')
         return True
     except Exception:
         logger.fatal('An unexpected error occurred while changing currency.', exc_info=True)
         return False
 
-def click_element_refresh_stale(wd: webdriver.WebDriver, element: WebElement, by: By, locator: str, index = None):
-    """Click the element and keep refetching and re-clicking if stale
+def click_element_refresh_stale(wd: webdriver.WebDriver, element: WebElement, by: By, locator: str, index = None, max_retries: int = None):
+    """Click the element and refetch and re-click it if stale
 
     Args:
         wd (webdriver.WebDriver): the driver to be used by this operation
@@ -150,21 +1523,34 @@ def click_element_refresh_stale(wd: webdriver.WebDriver, element: WebElement, by
         by (By): criteria used for refetching the element if stale e.g. class-name, id...
         locator (str): the value of the given criteria
         index (int, optional): the index specifying which element to be selected if criteria would result in multiple matches. Defaults to None.
+        max_retries (int, optional): maximum number of refetches. Defaults to None (MAX_CLICK_RETRIES).
+
+    Raises:
+        WebDriverException: the element could not be clicked after max_retries refetches
+        DeadlineExceededError: the task ran past its time budget
 
     Returns:
         webElement: the clicked element after refresh
     """
-    while True:
+    max_retries = MAX_CLICK_RETRIES if max_retries is None else max_retries
+    for attempt in range(max_retries + 1):
+        check_deadline()
         try:
             wd.execute_script(JAVASCRIPT_EXECUTE_CLICK, element)
             return element
-        except Exception:
-            logger.debug('Could not click element. Refreshing...')
-            if index is None:
-                element = wd.find_element(by, locator)
-            else:
-                element = wd.find_elements(by, locator)[index]
-
+        except WebDriverException:
+            if attempt == max_retries:
+                raise
+            get_stage_metrics().increment('click_retry')
+            logger.debug('Could not click element. Refreshing (%d/%d)...', attempt + 1, max_retries)
+            try:
+                if index is None:
+                    element = wd.find_element(by, locator)
+                else:
+                    element = wd.find_elements(by, locator)[index]
+            except (NoSuchElementException, IndexError):
+                logger.debug('Could not refetch element "%s".', locator)
+
 def get_variation_name(variation_details: dict[str, object]):
     """helper function to get the name of the variation column based on product-type
 
@@ -213,26 +1599,27 @@ def get_attribute_retry_stale(wd: webdriver.WebDriver, element: WebElement ,attr
 
     if element is None: return None
     while stale_counter < max_retries:
+        check_deadline()
         try:
             result = element.get_attribute(attribute)
             break
         except StaleElementReferenceException:
-            variation = get_variation_name(variation_details)
-            logger.debug(f'{label} {index + 1 if index is not None else ""} in URL: "{variation_details["product_url"]}" variation: "{variation}" is stale. Refreshing...')
+            stale_counter += 1
+            get_stage_metrics().increment('stale_retry')
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('%s %s in URL: "%s" variation: "%s" is stale. Refreshing (%d/%d)...', label, index + 1 if index is not None else '', 
+                             variation_details.get('product_url'), get_variation_name(variation_details), stale_counter, max_retries)
             if index is None:
                 searched_element = safe_get_element(wd, by, value)
                 if searched_element is not None:
                     element = searched_element
-                else:
-                    stale_counter += 1
             else:
-                elements = wd.find_elements(By.CLASS_NAME, 'athenaProductImageCarousel_image')
+                elements = wd.find_elements(by, value)
                 if len(elements) >= index + 1:
                     element = elements[index]
-                else:
-                    stale_counter += 1
     return result
 
+@timed_stage('get_variation_images')
 def get_variation_images(wd: webdriver.WebDriver, variation_details:dict[str, object]):
     """get carousel images for sub variant
 
@@ -243,10 +1630,17 @@ def get_variation_images(wd: webdriver.WebDriver, variation_details:dict[str, ob
     Returns:
         dict[str, object]: the updated product
     """
+    if BULK_CAROUSEL_IMAGES:
+        return get_variation_images_bulk(wd, variation_details)
     right_arrow = wd.find_element(By.CLASS_NAME, 'athenaProductImageCarousel_rightArrow')
     for i, image in enumerate(wd.find_elements(By.CLASS_NAME, 'athenaProductImageCarousel_image')):
         if i != 0:
-            right_arrow = click_element_refresh_stale(wd, right_arrow, By.CLASS_NAME, 'athenaProductImageCarousel_rightArrow')
+            try:
+                right_arrow = click_element_refresh_stale(wd, right_arrow, By.CLASS_NAME, 'athenaProductImageCarousel_rightArrow')
+            except WebDriverException:
+                logger.warning('Could not move the carousel of URL: "%s" variation: "%s". Keeping %d images...', 
+                               variation_details.get('product_url'), get_variation_name(variation_details), i)
+                break
         image_src = get_attribute_retry_stale(wd, image, 'src', variation_details, By.CLASS_NAME
                                                            , 'athenaProductImageCarousel_image', i, 'image')
         if image_src is None:
@@ -255,6 +1649,48 @@ def get_variation_images(wd: webdriver.WebDriver, variation_details:dict[str, ob
         variation_details[column_name] = image_src
     return variation_details
 
+def get_variation_images_bulk(wd: webdriver.WebDriver, variation_details:dict[str, object]):
+    """get every carousel image for sub variant in a single round trip without clicking through the carousel.
+    Lazy loaded images are resolved from data-src or srcset
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+        variation_details (dict[str, object]): the variant to be updated
+
+    Returns:
+        dict[str, object]: the updated product
+    """
+    try:
+        image_sources = wd.execute_script(JAVASCRIPT_GET_CAROUSEL_IMAGES) or []
+    except WebDriverException:
+        logger.debug('Could not read carousel images in URL: "%s" variation: "%s".', variation_details.get('product_url'), 
+                     get_variation_name(variation_details), exc_info=True)
+        image_sources = []
+    for i, image_src in enumerate(image_sources):
+        if not image_src:
+            break
+        variation_details[f'product_image_{i+1}'] = image_src
+    return variation_details
+
+def pick_image_source(attributes: dict[str, str]):
+    """pick the real url of an image that may be lazy loaded: data-src, then src unless it is an inline placeholder, then the first srcset candidate
+
+    Args:
+        attributes (dict[str, str]): the attributes of the img element
+
+    Returns:
+        str | None: the image url or None if the element has no usable source
+    """
+    src = attributes.get('src')
+    if attributes.get('data-src'):
+        return attributes['data-src']
+    if src and not src.startswith('data:'):
+        return src
+    for srcset in (attributes.get('srcset'), attributes.get('data-srcset')):
+        if srcset and srcset.strip():
+            return srcset.strip().split(',')[0].strip().split(' ')[0]
+    return None
+
 def wait_for_presence_get(wd: webdriver.WebDriver, by: By, value: str, wait_for: int = 2, must_be_visible = False):
     """wait for presence of element before fetching from DOM
 
@@ -277,6 +1713,43 @@ def wait_for_presence_get(wd: webdriver.WebDriver, by: By, value: str, wait_for:
         return None
     return wd.find_element(by, value)
 
+def parse_leading_number(text: str, cast = float):
+    """parse the number at the start of a text such as '4.5 Stars' or '123 Reviews'
+
+    Args:
+        text (str): the text to be parsed
+        cast (type, optional): the numeric type of the result. Defaults to float.
+
+    Returns:
+        int | float | None: the parsed number or None if text is None or does not start with a number
+    """
+    if text is None:
+        return None
+    try:
+        return cast(text.strip().split(' ')[0])
+    except ValueError:
+        return None
+
+def get_variation_fields(wd: webdriver.WebDriver):
+    """read the raw per variant fields of the current page in a single round trip to the browser
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+
+    Returns:
+        dict[str, object]: product_name, product_rating, number_of_reviews and price as raw strings and sold_out as a bool.
+        Missing fields are None
+    """
+    try:
+        fields = wd.execute_script(JAVASCRIPT_GET_VARIATION_FIELDS)
+    except WebDriverException:
+        logger.debug('Could not read variation fields in URL: "%s".', wd.current_url, exc_info=True)
+        fields = None
+    if not isinstance(fields, dict):
+        fields = {}
+    return {key: fields.get(key) for key in ['product_name', 'product_rating', 'number_of_reviews', 'price', 'sold_out']}
+
+@timed_stage('get_variation_misc_details')
 def get_variation_misc_details(wd: webdriver.WebDriver, variation_details:dict[str, object], product_id: str, force_out_of_stock = False):
     """get a variety of miscellaneous details for a given sub variant 
 
@@ -289,376 +1762,1331 @@ def get_variation_misc_details(wd: webdriver.WebDriver, variation_details:dict[s
     Returns:
         dict[str, object]: the updated sub variant
     """
-    
+    fields = get_variation_fields(wd)
     variation_details['variant_SKU'] = product_id
-    product_name = wait_for_presence_get(wd, By.CLASS_NAME, 'productName_title')
-    variation_details['product_name'] = get_attribute_retry_stale(wd, product_name, 'textContent', variation_details
-                                                                ,By.CLASS_NAME, 'productName_title', label='Product name')
+    variation_details['product_name'] = fields['product_name']
+    variation_details['product_rating'] = parse_leading_number(fields['product_rating'])
+    variation_details['number_of_reviews'] = parse_leading_number(fields['number_of_reviews'], int)
+    variation_details['price'] = fields['price'].strip('£ ') if fields['price'] is not None else None
+    if fields['price'] is None:
+        logger.warning('Could not find price in URL: "%s" variation: "%s".', variation_details['product_url'], get_variation_name(variation_details))
+    variation_details['in_stock'] = 'no' if fields['sold_out'] or force_out_of_stock else 'yes'
+    return variation_details
+
+def get_multi_size_details(wd: webdriver.WebDriver, product_details: dict[str, object]) -> list[dict[str, object]]:
+    """get sub variants of multi size product
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+        product_details (dict[str, object]): the parent product
+
+    Returns:
+        list[dict[str, object]]: details of sub variants of parent product
+    """
+    variations = []
+    seen_images = set()
+    for i in range(len(wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box'))):
+        check_deadline()
+        button = wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box')[i]
+        variation_details = product_details.copy()
+        is_selected = safe_get_element(button, By.CLASS_NAME, 'srf-hide')
+        if is_selected is None:
+            old_price = get_old_price(wd)
+            wd.execute_script(JAVASCRIPT_EXECUTE_CLICK, button)
+            if not wait_for_variant_switch(wd, old_price, seen_images):
+                logger.warning('Variation %d of URL: "%s" did not switch after %s seconds.', i, product_details['product_url'], VARIANT_SWITCH_TIMEOUT_SEC)
+            button = wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box')[i]
+        variation_details['size'] = button.text
+        variation_details = get_variation_images(wd, variation_details)
+        if not is_new_variation(variation_details, seen_images):
+            continue
+        product_id = get_value_from_base_name(variation_details['product_image_1'])
+        variation_details = get_variation_misc_details(wd, variation_details, product_id)
+        variations.append(variation_details)
+    return variations
+
+def get_value_from_base_name(url:str, first_splitter = '.', second_splitter = '-'):
+    """get a value from the base name of a url after splitting twice
+
+    Args:
+        url (str): the url to get the value from
+        first_splitter (str, optional): first character to split on. Defaults to '.'.
+        second_splitter (str, optional): second character to split on. Defaults to '-'.
+
+    Returns:
+        _type_: _description_
+    """
+    base_name = os.path.basename(urlsplit(url).path)
+    return base_name.split(first_splitter)[0].split(second_splitter)[0].strip()
+
+def get_old_price(wd: webdriver.WebDriver):
+    """Get price of product when you reach the page before clicking on sub variants
+
+    Args:
+        wd (webdriver.WebDriver): the driver to be used by this operation
+
+    Returns:
+        str: the price of the product
+    """
     try:
-        product_rating = wait_for_presence_get(wd ,By.CLASS_NAME, 'productReviewStarsPresentational')
+        return wd.find_element(By.CLASS_NAME, 'productPrice_price')
+    except NoSuchElementException:
+        return wd.find_element(By.CLASS_NAME, 'productPrice_fromPrice')
+    
+def rgb_to_hex(rgb: list):
+    """Convert rgb values to hex
+
+    Args:
+        rgb (list): list of integers representing rgb values
+
+    Returns:
+        str: the hex value prefixed with #
+    """
+    return '#%02x%02x%02x' % (int(rgb[0]), int(rgb[1]), int(rgb[2]))
+
+def get_multi_color_shade_option_details(wd: webdriver.WebDriver, product_details: dict[str, object], product_type: str) -> list[dict[str, object]]:
+    """get sub variants of multi color/shade/option product
 
-        product_rating = get_attribute_retry_stale(wd, product_rating, 'aria-label', variation_details, By.CLASS_NAME, 
-                                                   'productReviewStarsPresentational', label='Product rating')
-        if product_rating is not None:
-            variation_details['product_rating'] = float(product_rating.strip().split(' ')[0])
+    Args:
+        wd (webdriver.WebDriver): the chrome webdriver to be used for this operation
+        product_details (dict[str, object]): the parent product of the sub variants
+        product_type (str): the ProductType of the parent product
+
+    Raises:
+        ValueError: if product type is not color/shade/option
+
+    Returns:
+        list[dict[str, object]]: the sub variants of the parent product
+    """
+    
+    if product_type == ProductType.MULTI_COLOR:
+        variation_type = 'color'
+    elif product_type == ProductType.MULTI_SHADE:
+        variation_type = 'shade'
+    elif product_type == ProductType.MULTI_OPTION:
+        variation_type = 'option'
+    else:
+        raise ValueError(f'Invalid product type: {product_type}')
+    variations = []
+    seen_images = set()
+    drop_down_list = wd.find_element(By.CLASS_NAME, 'athenaProductVariations_dropdown')
+    select = Select(drop_down_list)
+    for option, id in [(x.text, x.get_attribute('value')) for x in select.options if x.text.casefold() != 'Please choose...'.casefold()]:
+        check_deadline()
+        variation_details = product_details.copy()
+        old_price = get_old_price(wd)
+        select = Select(wd.find_element(By.CLASS_NAME, 'athenaProductVariations_dropdown'))
+        select.select_by_visible_text(option)
+        if not wait_for_variant_switch(wd, old_price, seen_images):
+            logger.debug('Variation "%s" of URL: "%s" did not switch after %s seconds.', option, product_details['product_url'], VARIANT_SWITCH_TIMEOUT_SEC)
+        force_out_of_stock = False
+        if option.endswith('- Out of stock'):
+            force_out_of_stock = True
+        variation_details[variation_type] = option.removesuffix('- Out of stock').strip()
+        variation_details = get_variation_images(wd, variation_details)
+        if not is_new_variation(variation_details, seen_images):
+            continue
+        product_id = get_value_from_base_name(variation_details['product_image_1'])
+        variation_details = get_variation_misc_details(wd, variation_details, product_id, force_out_of_stock)
+
+        if product_type != ProductType.MULTI_OPTION:
+            color = wd.find_element(By.CSS_SELECTOR, f"span[data-value-id='{id}']").value_of_css_property('background-color')
+            color = Color.from_string(color).hex
+            variation_details[f'{variation_type}_hex'] = color
+        variations.append(variation_details)
+    return variations
+
+def create_serialized_sku(df: pd.DataFrame):
+    """Serialize the sub variants of every product: the parent row (variant_SKU == primary_SKU) gets the #1 serial number
+    and the other sub variants get #2..n in their order of appearance
+
+    Args:
+        df (pd.DataFrame): the sub variants with primary_SKU and variant_SKU columns
+
+    Returns:
+        pd.DataFrame: serialized_primary_SKU and is_variant_of (the primary SKU of the parent, NA for parent rows) aligned with df
+    """
+    primary_skus = df['primary_SKU']
+    is_parent = primary_skus == df['variant_SKU']
+    serial_numbers = (~is_parent).groupby(primary_skus).cumsum().add(1).where(~is_parent, 1)
+    return pd.DataFrame({'serialized_primary_SKU': primary_skus + '-' + serial_numbers.astype('Int64').astype(str),
+                         'is_variant_of': primary_skus.where(~is_parent, pd.NA)}, index=df.index)
+
+@timed_stage('variant_enumeration')
+def get_product_variations_from_type(wd: webdriver.WebDriver, product_details: dict[str, object], url: str):
+    """get sub variants of product based on it's type
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver used for this operation
+        product_details (dict[str, object]): the parent product details
+        url (str): link to parent product
+
+    Returns:
+        list[dict[str, object]]: list of sub variants of parent product
+    """
+    variation_label = safe_get_element(wd, By.CLASS_NAME, 'athenaProductVariations_dropdownLabel')
+    product_variations = []
+    if variation_label is not None:
+        variation = variation_label.text.strip()
+        if variation.replace(' ', '').casefold() in color_variation_tags:
+            product_details['product_type'] = ProductType.MULTI_COLOR
+            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_COLOR)
+        elif variation.replace(' ', '').casefold() in shade_variation_tags:
+            product_details['product_type'] = ProductType.MULTI_SHADE
+            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_SHADE)
+        elif variation.replace(' ', '').casefold() in size_variation_tags:
+            product_details['product_type'] = ProductType.MULTI_SIZE
+            product_variations = get_multi_size_details(wd, product_details)
+        elif variation.replace(' ', '').casefold() in option_variation_tags:
+            product_details['product_type'] = ProductType.MULTI_OPTION
+            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_OPTION)
         else:
-            variation_details['product_rating'] = None
-    except NoSuchElementException:
-        variation_details['product_rating'] = None
+            logger.error('Unknown variant type: "%s". URL: %s', variation, url)
+    else:
+        product_details['product_type'] = ProductType.SINGLE
+        product_details = get_variation_images(wd, product_details)
+        if not product_details.get('product_image_1', False):
+            logger.error('Could not find primary image of single product from URL: "%s".', product_details['product_url'])
+            return product_variations
+        product_id = get_value_from_base_name(product_details['product_image_1'])
+        product_details = get_variation_misc_details(wd, product_details, product_id)
+        product_variations = [product_details]
+    return product_variations
+
+@timed_stage('get_product_descriptions')
+def get_product_descriptions(wd: webdriver.WebDriver, product_details: dict[str, object]):
+    """get descriptions hidden by buttons for a product
+
+    Args:
+        wd (webdriver.WebDriver): the chrome webdriver used for this operation
+        product_details (dict[str, object]): the product that we will get the descriptions for.
+
+    Returns:
+        dict[str, object]: the updated product
+    """
+    for button in wd.find_elements(By.CLASS_NAME, 'productDescription_accordionControl'):
+        try:
+            if not button.text:
+                continue
+            button_id = button.get_attribute("id")
+            is_expanded = button.get_attribute('aria-expanded')
+            if is_expanded == 'false':
+                wd.execute_script(JAVASCRIPT_EXECUTE_CLICK, button)
+            description_content = wd.find_element(By.ID, button_id.replace('heading', 'content')).text
+            product_details[button.text] = description_content
+        except ElementNotInteractableException:
+            logger.debug('cannot click element with id: %s', button_id)
+        except Exception:
+            logger.exception('Unexpected error occurred while getting product descriptions.', exc_info=True)
+    
+    return product_details
+
+def get_product_details(wd: webdriver.WebDriver, url: str, product_category: str, store: CheckpointStore = None):
+    """get every sub variant of a single product url
+
+    Args:
+        wd (webdriver.WebDriver): the chrome webdriver to be used for scraping
+        url (str): link to the product page
+        product_category (str): the category of the product
+        store (CheckpointStore, optional): store the primary SKU is claimed in before the sub variants are scraped. Defaults to None.
+
+    Raises:
+        DuplicateProductError: the primary SKU is already claimed by another product url
+
+    Returns:
+        list[dict[str, object]]: the sub variants of the product or an empty list if the primary SKU could not be found
+    """
+    load_page(wd, url)
+    wait_for_page_ready(wd, JAVASCRIPT_PRODUCT_PAGE_READY)
+    product_details = {}
+    product_details['product_url'] = url
+    product_details['product_category'] = product_category
+    brand_element = safe_get_element(wd, By.CLASS_NAME, 'productBrandLogo_image')
+
+    product_details['brand_name'] = brand_element.get_attribute('title') if brand_element is not None else None
+    product_details['brand_logo'] = brand_element.get_attribute('src') if brand_element is not None else None
+
     try:
-        number_of_reviews = wait_for_presence_get(wd, By.CLASS_NAME, 'productReviewStars_numberOfReviews')
-        number_of_reviews = get_attribute_retry_stale(wd, number_of_reviews, 'textContent', variation_details, By.CLASS_NAME, 
-                                                   'productReviewStars_numberOfReviews', label='Number of reviews')
-        if number_of_reviews is not None:
-            variation_details['number_of_reviews'] = int(number_of_reviews.strip().split(' ')[0])
+        primary_sku = wd.execute_script(JAVASCRIPT_GET_PRIMARY_IMAGE)
+    except WebDriverException:
+        logger.debug('Could not read the primary image of URL: "%s".', url, exc_info=True)
+        primary_sku = None
+    if primary_sku is None:
+        logger.error('Could not find primary SKU for URL: "%s". Skipping...', url)
+        return []
+    product_details['primary_SKU'] = get_value_from_base_name(primary_sku)
+    if store is not None:
+        canonical_url = store.claim_sku(product_details['primary_SKU'], url)
+        if canonical_url is not None:
+            raise DuplicateProductError(canonical_url)
+    product_details = get_product_descriptions(wd, product_details)
+    return get_product_variations_from_type(wd, product_details, url)
+
+class ProductPageParser(HTMLParser):
+    """Collect the static product details from the raw html of a product page
+
+    Attributes:
+        brand (dict[str, str] | None): title and src of the brand logo
+        images (list[str]): src of every carousel image in order
+        texts (dict[str, str]): text content of the single value elements keyed by class name
+        attributes (dict[str, dict[str, str]]): attributes of the single value elements keyed by class name
+        accordion_headings (list[tuple[str, str]]): (id, text) of every description accordion button
+        contents (dict[str, str]): text of every element whose id contains 'content' keyed by id
+        has_variations (bool): True if the page has interactive variant controls
+        sold_out (bool): True if the sold out button is present
+        json_ld (list[object]): every parsed ld+json payload embedded in the page
+    """
+    VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+    BLOCK_ELEMENTS = {'p', 'div', 'li', 'ul', 'ol', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'tr', 'section'}
+    TEXT_CLASSES = {'productName_title', 'productReviewStars_numberOfReviews', 'productPrice_price'}
+    ATTRIBUTE_CLASSES = {'productReviewStarsPresentational'}
+    VARIATION_CLASSES = {'athenaProductVariations_dropdownLabel', 'athenaProductVariations_dropdown', 'athenaProductVariations_box'}
+    LINE_BREAK = '\x00'
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.brand = None
+        self.images = []
+        self.texts = {}
+        self.attributes = {}
+        self.accordion_headings = []
+        self.contents = {}
+        self.has_variations = False
+        self.sold_out = False
+        self.json_ld = []
+        self._captures = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = set((attrs.get('class') or '').split())
+        for capture in self._captures:
+            if tag in self.BLOCK_ELEMENTS or tag == 'br':
+                capture['parts'].append(self.LINE_BREAK if tag != 'br' else '\n')
+            if tag not in self.VOID_ELEMENTS:
+                capture['depth'] += 1
+
+        if tag == 'img' and 'productBrandLogo_image' in classes and self.brand is None:
+            self.brand = {'title': attrs.get('title'), 'src': attrs.get('src')}
+        if tag == 'img' and 'athenaProductImageCarousel_image' in classes:
+            self.images.append(pick_image_source(attrs))
+        if 'productAddToBasket-soldOut' in classes:
+            self.sold_out = True
+        if classes & self.VARIATION_CLASSES:
+            self.has_variations = True
+        for class_name in classes & self.ATTRIBUTE_CLASSES:
+            self.attributes.setdefault(class_name, attrs)
+        if tag in self.VOID_ELEMENTS:
+            return
+
+        element_id = attrs.get('id') or ''
+        if 'productDescription_accordionControl' in classes:
+            self._start_capture(('heading', element_id))
+        elif 'content' in element_id:
+            self._start_capture(('content', element_id))
+        for class_name in classes & self.TEXT_CLASSES:
+            if class_name not in self.texts:
+                self._start_capture(('text', class_name))
+        if tag == 'script' and (attrs.get('type') or '').casefold() == 'application/ld+json':
+            self._start_capture(('json', None))
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID_ELEMENTS:
+            return
+        for capture in list(self._captures):
+            if tag in self.BLOCK_ELEMENTS:
+                capture['parts'].append(self.LINE_BREAK)
+            capture['depth'] -= 1
+            if capture['depth'] == 0:
+                self._captures.remove(capture)
+                self._finish_capture(capture)
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture['parts'].append(data)
+
+    def _start_capture(self, key: tuple[str, str]):
+        # the depth counts the element itself, it is decremented by its own end tag
+        self._captures.append({'key': key, 'depth': 1, 'parts': []})
+
+    def _finish_capture(self, capture: dict[str, object]):
+        kind, name = capture['key']
+        if kind == 'json':
+            try:
+                self.json_ld.append(json.loads(''.join(capture['parts'])))
+            except ValueError:
+                logger.debug('Could not parse embedded ld+json payload.')
+            return
+        text = self.normalize_text(capture['parts'])
+        if kind == 'heading':
+            self.accordion_headings.append((name, text))
+        elif kind == 'content':
+            self.contents[name] = text
         else:
-            variation_details['number_of_reviews'] = None
-    except NoSuchElementException:
-        variation_details['number_of_reviews'] = None
-    variation_details['price'] = wd.find_element(By.CLASS_NAME, 'productPrice_price').text.strip('£ ')
+            self.texts[name] = text
+
+    @classmethod
+    def normalize_text(cls, parts: list[str]):
+        """join text parts the way the browser renders them: collapsed white space, one line per block element and br"""
+        text = ''.join(x if x in ('\n', cls.LINE_BREAK) else re.sub(r'\s+', ' ', x) for x in parts)
+        text = re.sub(f'{cls.LINE_BREAK}+', '\n', text)
+        return '\n'.join(line.strip() for line in text.split('\n')).strip('\n')
+
+    def get_json_ld_product(self):
+        """get the first ld+json entry describing a product
+
+        Returns:
+            dict[str, object]: the product entry or an empty dict if not found
+        """
+        pending = list(self.json_ld)
+        while pending:
+            entry = pending.pop(0)
+            if isinstance(entry, list):
+                pending.extend(entry)
+            elif isinstance(entry, dict):
+                if entry.get('@type') == 'Product':
+                    return entry
+                pending.extend(entry.get('@graph', []))
+        return {}
+
+class ListingPageParser(HTMLParser):
+    """Collect the product blocks and the pagination from the raw html of a category listing page
+
+    Attributes:
+        items (list[dict[str, str]]): href, name and price of every product block in page order, hrefs are kept as found
+        last_page (int | None): number of the last page or None if the pagination is not present
+    """
+    VOID_ELEMENTS = ProductPageParser.VOID_ELEMENTS
+    ITEM_FIELDS = {'productBlock_productName': 'name', 'productBlock_priceValue': 'price'}
+    LAST_PAGE_CLASSES = {'responsivePaginationButton', 'responsivePageSelector', 'responsivePaginationButton--last'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items = []
+        self.last_page = None
+        self._item_depth = 0
+        self._captures = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_ELEMENTS:
+            return
+        attrs = dict(attrs)
+        classes = set((attrs.get('class') or '').split())
+        for capture in self._captures:
+            capture['depth'] += 1
+        if self._item_depth:
+            self._item_depth += 1
+        elif 'productBlock_itemDetails_wrapper' in classes:
+            self.items.append({'url': None, 'name': None, 'price': None})
+            self._item_depth = 1
+
+        if self._item_depth:
+            item = self.items[-1]
+            if tag == 'a' and 'productBlock_link' in classes and item['url'] is None:
+                item['url'] = attrs.get('href')
+            for class_name in classes & self.ITEM_FIELDS.keys():
+                if item[self.ITEM_FIELDS[class_name]] is None:
+                    self._captures.append({'item': item, 'field': self.ITEM_FIELDS[class_name], 'depth': 1, 'parts': []})
+        if tag == 'a' and self.LAST_PAGE_CLASSES <= classes:
+            self._captures.append({'item': None, 'field': 'last_page', 'depth': 1, 'parts': []})
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID_ELEMENTS:
+            return
+        if self._item_depth:
+            self._item_depth -= 1
+        for capture in list(self._captures):
+            capture['depth'] -= 1
+            if capture['depth'] == 0:
+                self._captures.remove(capture)
+                text = ''.join(capture['parts']).strip()
+                if capture['item'] is not None:
+                    capture['item'][capture['field']] = text
+                elif text.isdigit():
+                    self.last_page = int(text)
+
+    def handle_data(self, data):
+        for capture in self._captures:
+            capture['parts'].append(data)
+
+def get_http_pool():
+    """get the pooled http client of the current process, created on first use so every worker owns its connections
+
+    Returns:
+        urllib3.PoolManager: the pooled http client
+    """
+    global http_pool
+    if http_pool is None:
+        http_pool = urllib3.PoolManager(num_pools=HTTP_POOL_SIZE, maxsize=HTTP_POOL_SIZE, 
+                                        retries=urllib3.Retry(total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]),
+                                        timeout=urllib3.Timeout(connect=5, read=HTTP_TIMEOUT_SEC))
+    return http_pool
+
+def get_session_headers(wd: webdriver.WebDriver, cookies: list[dict[str, object]] = None):
+    """get the headers needed to send plain http requests on behalf of the browser session (cookies and user agent)
+
+    Args:
+        wd (webdriver.WebDriver): the prepared chrome driver
+        cookies (list[dict[str, object]], optional): cookies of the session. Defaults to the cookies of the current page of the driver.
+
+    Returns:
+        dict[str, str]: the request headers
+    """
+    if cookies is None:
+        cookies = wd.get_cookies()
+    return {
+        'Cookie': '; '.join(f'{cookie["name"]}={cookie["value"]}' for cookie in cookies),
+        'User-Agent': wd.execute_script('return navigator.userAgent;'),
+        'Accept': 'text/html,application/xhtml+xml',
+    }
+
+def get_product_details_http(url: str, product_category: str, headers: dict[str, str]):
+    """get the details of a single variant product from the raw html without a browser
+
+    Args:
+        url (str): link to the product page
+        product_category (str): the category of the product
+        headers (dict[str, str]): headers of the browser session used for the request
+
+    Returns:
+        list[dict[str, object]] | None: the product as a single sub variant, None if the page has interactive variants
+        or could not be parsed and must be scraped with selenium
+    """
+    response = http_request(url, headers)
+    if response.status != 200:
+        logger.debug('Got status %d for URL: "%s". Falling back to selenium...', response.status, url)
+        return None
+    parser = ProductPageParser()
+    parser.feed(response.data.decode('utf-8', errors='replace'))
+    parser.close()
+    if parser.has_variations:
+        return None
+    json_ld = parser.get_json_ld_product()
+    images = [urljoin(url, x) for x in parser.images if x]
+    if not images and json_ld.get('image'):
+        images = [urljoin(url, x) for x in (json_ld['image'] if isinstance(json_ld['image'], list) else [json_ld['image']])]
+    if not images:
+        logger.debug('Could not find carousel images for URL: "%s". Falling back to selenium...', url)
+        return None
+
+    product_details = {}
+    product_details['product_url'] = url
+    product_details['product_category'] = product_category
+    brand = parser.brand or {}
+    json_ld_brand = json_ld.get('brand')
+    product_details['brand_name'] = brand.get('title') or (json_ld_brand.get('name') if isinstance(json_ld_brand, dict) else json_ld_brand)
+    product_details['brand_logo'] = urljoin(url, brand['src']) if brand.get('src') else None
+    product_details['primary_SKU'] = get_value_from_base_name(images[0])
+    for heading_id, heading in parser.accordion_headings:
+        if not heading:
+            continue
+        content = parser.contents.get(heading_id.replace('heading', 'content'))
+        if content is not None:
+            product_details[heading] = content
+    product_details['product_type'] = ProductType.SINGLE
+    for i, image in enumerate(images):
+        product_details[f'product_image_{i+1}'] = image
+
+    product_details['variant_SKU'] = get_value_from_base_name(images[0])
+    product_details['product_name'] = parser.texts.get('productName_title', json_ld.get('name'))
+    aggregate_rating = json_ld.get('aggregateRating') or {}
+    product_rating = parser.attributes.get('productReviewStarsPresentational', {}).get('aria-label')
+    if product_rating is None and 'ratingValue' in aggregate_rating:
+        product_rating = str(aggregate_rating['ratingValue'])
+    product_details['product_rating'] = parse_leading_number(product_rating)
+    number_of_reviews = parser.texts.get('productReviewStars_numberOfReviews')
+    if number_of_reviews is None and 'reviewCount' in aggregate_rating:
+        number_of_reviews = str(aggregate_rating['reviewCount'])
+    product_details['number_of_reviews'] = parse_leading_number(number_of_reviews, int)
+    offers = json_ld.get('offers') or {}
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    price = parser.texts.get('productPrice_price')
+    if price is None and offers.get('price') is None:
+        logger.debug('Could not find price for URL: "%s". Falling back to selenium...', url)
+        return None
+    product_details['price'] = price.strip('£ ') if price is not None else str(offers['price'])
+    out_of_stock = parser.sold_out or str(offers.get('availability', '')).endswith('OutOfStock')
+    product_details['in_stock'] = 'no' if out_of_stock else 'yes'
+    return [product_details]
+
+def scrape_product(wd: webdriver.WebDriver, url: str, product_category: str, headers: dict[str, str] = None, store: CheckpointStore = None):
+    """get every sub variant of a product using the http fast path when enabled, falling back to selenium when needed
+
+    Args:
+        wd (webdriver.WebDriver): the chrome webdriver to be used as a fallback
+        url (str): link to the product page
+        product_category (str): the category of the product
+        headers (dict[str, str], optional): headers of the browser session used by the http fast path. Defaults to None.
+        store (CheckpointStore, optional): store the primary SKU is claimed in before the selenium deep scrape. Defaults to None.
+
+    Returns:
+        list[dict[str, object]]: the sub variants of the product
+    """
+    if USE_HTTP_FAST_PATH and headers is not None:
+        try:
+            product_variations = get_product_details_http(url, product_category, headers)
+            if product_variations is not None:
+                return product_variations
+        except Exception:
+            logger.warning('HTTP fast path failed for URL: "%s". Falling back to selenium...', url, exc_info=True)
+    return get_product_details(wd, url, product_category, store)
+
+def get_category_name(url: str):
+    """get a readable category name from a category url
+
+    Args:
+        url (str): link to the category listing e.g. https://www.cultbeauty.com/skin-care.list
+
+    Returns:
+        str: the category name e.g. skin care
+    """
+    return get_value_from_base_name(url, second_splitter=' ').replace('-', ' ')
+
+def prepare_session(wd: webdriver.WebDriver, url: str):
+    """accept cookies, close the email popup and change the currency for a fresh driver
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver to be prepared
+        url (str): any page of the website to be used for the setup
+
+    Returns:
+        bool: True if the session is ready for scraping, False otherwise
+    """
     try:
-        wd.find_element(By.CLASS_NAME, 'productAddToBasket-soldOut')
-        variation_details['in_stock'] = 'no'
-    except NoSuchElementException:
-        if force_out_of_stock:
-            variation_details['in_stock'] = 'no'
-        else:
-            variation_details['in_stock'] = 'yes'
-    return variation_details
+        load_page(wd, url)
+    except WebDriverException:
+        logger.error('Could not load URL: "%s" to prepare the session.', url, exc_info=True)
+        return False
+    for label, by, value in [('cookie consent', By.ID, 'onetrust-accept-btn-handler'), 
+                             ('email popup', By.CSS_SELECTOR, 'body > div.emailReengagement > div > div.emailReengagement_form_container > button > svg > path')]:
+        try:
+            popup_button = wait_for_presence_get(wd, by, value, wait_for=10, must_be_visible=True)
+            if popup_button is None:
+                logger.warning('Could not find %s for URL: "%s". Continuing...', label, url)
+                continue
+            popup_button.click()
+        except WebDriverException:
+            logger.warning('Could not dismiss %s for URL: "%s". Continuing...', label, url, exc_info=True)
+    if not change_currency(wd, SESSION_CURRENCY):
+        logger.error('Could not change currency using URL: "%s".', url)
+        return False
+    logger.info('Currency changed successfully.')
+    return True
+
+def is_session_ready(wd: webdriver.WebDriver, url: str):
+    """load a page and check that the session currency is selected, used to verify a driver set up from injected cookies
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver to be checked
+        url (str): any page of the website to be used for the check
+
+    Returns:
+        bool: True if the page shows prices in SESSION_CURRENCY, False otherwise
+    """
+    try:
+        load_page(wd, url)
+        currency_select = wait_for_presence_get(wd, By.CLASS_NAME, 'sessionSettings_currencySelect', wait_for=10)
+        if currency_select is None:
+            logger.warning('Could not locate currency select list to verify the session using URL: "%s".', url)
+            return False
+        currency = wd.execute_script(JAVASCRIPT_GET_SELECTED_OPTION, currency_select)
+    except WebDriverException:
+        logger.warning('Could not verify the session using URL: "%s".', url, exc_info=True)
+        return False
+    if currency != SESSION_CURRENCY:
+        logger.warning('Injected session shows currency %s instead of %s.', currency, SESSION_CURRENCY)
+        return False
+    return True
+
+def prepare_session_retry(wd: webdriver.WebDriver, url: str, attempts: int = None):
+    """prepare the session retrying on failure
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver to be prepared
+        url (str): any page of the website to be used for the setup
+        attempts (int, optional): maximum number of attempts. Defaults to SESSION_SETUP_ATTEMPTS.
+
+    Returns:
+        bool: True if the session is ready for scraping, False if every attempt failed
+    """
+    attempts = attempts or SESSION_SETUP_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        if prepare_session(wd, url):
+            return True
+        logger.warning('Session setup attempt %d/%d failed.', attempt, attempts)
+    logger.critical('Could not prepare session using URL: "%s".', url)
+    return False
+
+class BrowserSession:
+    """Factory of chrome drivers sharing one prepared session. The consent, popup and currency setup is done once,
+    the resulting cookies are exported and injected into every new or recycled driver.
+
+    Args:
+        browser_options (options.Options): options to be used by the chrome webdrivers
+        session_url (str): page of the website used for the setup
+        cookies (list[dict[str, object]], optional): cookies of an already prepared session. Defaults to None.
+        blocking_profile (dict[str, bool], optional): resource groups blocked by every driver. Defaults to None (RESOURCE_BLOCKING).
+    """
+
+    def __init__(self, browser_options: options.Options, session_url: str, cookies: list[dict[str, object]] = None,
+                 blocking_profile: dict[str, bool] = None):
+        self.browser_options = browser_options
+        self.session_url = session_url
+        self.cookies = cookies
+        self.headers = None
+        self.blocking_profile = RESOURCE_BLOCKING if blocking_profile is None else blocking_profile
+
+    def prepare(self):
+        """run the full setup in a temporary driver and export its cookies and the headers used for plain http requests
+
+        Returns:
+            bool: True if the cookies were exported, False if every setup attempt failed
+        """
+        with start_driver(self.browser_options, self.blocking_profile) as wd:
+            if not prepare_session_retry(wd, self.session_url):
+                return False
+            self.cookies = wd.get_cookies()
+            self.headers = get_session_headers(wd, self.cookies)
+        logger.info('Session prepared. Exported %d cookies.', len(self.cookies))
+        return True
+
+    def create_driver(self):
+        """start a driver ready for scraping, falling back to the full setup if the cookies cannot be injected or the injected
+        session does not show SESSION_CURRENCY
+
+        Returns:
+            webdriver.WebDriver | None: the driver or None if the session could not be prepared
+        """
+        wd = start_driver(self.browser_options, self.blocking_profile)
+        if self.cookies and self.inject_cookies(wd):
+            if is_session_ready(wd, self.session_url):
+                return wd
+            logger.warning('Injected session is not usable. Falling back to full session setup...')
+        if prepare_session_retry(wd, self.session_url):
+            self.cookies = wd.get_cookies()
+            return wd
+        wd.quit()
+        return None
+
+    def inject_cookies(self, wd: webdriver.WebDriver):
+        """set the exported cookies on a driver through the devtools protocol without loading any page
+
+        Args:
+            wd (webdriver.WebDriver): the driver to be updated
+
+        Returns:
+            bool: True if every cookie was set
+        """
+        cookies = []
+        for cookie in self.cookies:
+            cdp_cookie = {'name': cookie['name'], 'value': cookie['value'], 'domain': cookie.get('domain'), 'path': cookie.get('path', '/'),
+                          'secure': cookie.get('secure', False), 'httpOnly': cookie.get('httpOnly', False)}
+            if 'expiry' in cookie:
+                cdp_cookie['expires'] = cookie['expiry']
+            if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+                cdp_cookie['sameSite'] = cookie['sameSite']
+            cookies.append(cdp_cookie)
+        try:
+            wd.execute_cdp_cmd('Network.setCookies', {'cookies': cookies})
+        except WebDriverException:
+            logger.warning('Could not inject session cookies. Falling back to full session setup...', exc_info=True)
+            return False
+        return True
+
+    def get_headers(self, wd: webdriver.WebDriver):
+        """get the headers needed to send plain http requests on behalf of this session
+
+        Args:
+            wd (webdriver.WebDriver): any driver of this session
+
+        Returns:
+            dict[str, str]: the request headers
+        """
+        return get_session_headers(wd, self.cookies)
+
+
+def get_last_page(wd: webdriver.WebDriver, url: str):
+    """get the number of pages of the currently loaded category listing
 
-def get_multi_size_details(wd: webdriver.WebDriver, product_details: dict[str, object]) -> list[dict[str, object]]:
-    """get sub variants of multi size product
+    Args:
+        wd (webdriver.WebDriver): the chrome driver with the listing page loaded
+        url (str): link to the category listing used for logging
+
+    Returns:
+        int: the number of the last page, 1 if pagination is not present
+    """
+    last_page = safe_get_element(wd, By.CSS_SELECTOR, 'a.responsivePaginationButton.responsivePageSelector.responsivePaginationButton--last')
+    if last_page is None:
+        return 1
+    last_page = get_attribute_retry_stale(wd, last_page, 'textContent', {}, By.CSS_SELECTOR, 
+                                          'a.responsivePaginationButton.responsivePageSelector.responsivePaginationButton--last'
+                                          , label='Last Page button')
+    if last_page is None:
+        logger.warning('Could not find last page button for URL: "%s". Assuming 1 page...', url)
+        return 1
+    return int(last_page)
+
+def get_listing_items(wd: webdriver.WebDriver):
+    """get url, name and price of every unique product in the currently loaded listing page in a single round trip
 
     Args:
-        wd (webdriver.WebDriver): the driver to be used by this operation
-        product_details (dict[str, object]): the parent product
+        wd (webdriver.WebDriver): the chrome driver with the listing page loaded
 
     Returns:
-        list[dict[str, object]]: details of sub variants of parent product
+        list[dict[str, str]]: url, name and price of the products in page order
     """
-    variations = []
-    buttons = wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box')
-    for i, button in enumerate(buttons):
-        restart = True
-        restart_counter = 0
-        while restart:
-            button = wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box')[i]
-            variation_details = product_details.copy()
-            is_selected = safe_get_element(button, By.CLASS_NAME, 'srf-hide')
-            if is_selected is None:
-                old_price = get_old_price(wd)
-                wd.execute_script(JAVASCRIPT_EXECUTE_CLICK, button)
-                try:
-                    WebDriverWait(wd, 10).until(EC.staleness_of(old_price))
-                except Exception:
-                    logger.warning(f'Could not find old price for url: "{product_details["product_url"]}"')
-                button = wd.find_elements(By.CLASS_NAME, 'athenaProductVariations_box')[i]
-            variation_details['size'] = button.text
-            variation_details = get_variation_images(wd, variation_details)
-            if not variation_details.get('product_image_1', False):
-                logger.error(f'Could not find primary image from URL: "{variation_details["product_url"]}". Size: "{variation_details["size"]}"')
-                continue
-            if any([x.get('product_image_1', '') == variation_details['product_image_1'] for x in variations]):
-                logger.warning('Variation image %d in URL: "%s", variation: "%s" is duplicated. Retrying fetch...', 
-                            i, variation_details['product_url'], get_variation_name(variation_details))
-                restart_counter += 1
-                if restart_counter > MAX_RETRY_VARIATION:
-                    logger.warning(f'Max fetch retry reached for URL: "{variation_details["product_url"]}, variation: {get_variation_name(variation_details)}". Skipping variation...')
-                    restart = False
-                continue
-            
-            restart = False
-            product_id = get_value_from_base_name(variation_details['product_image_1'])
-            variation_details = get_variation_misc_details(wd, variation_details, product_id)
-            variations.append(variation_details)
-    return variations
+    items = {}
+    for item in wd.execute_script(JAVASCRIPT_GET_LISTING_ITEMS) or []:
+        if item.get('url') and item['url'] not in items:
+            items[item['url']] = item
+    return list(items.values())
 
-def get_value_from_base_name(url:str, first_splitter = '.', second_splitter = '-'):
-    """get a value from the base name of a url after splitting twice
+def get_listing_fingerprint(item: dict[str, str]):
+    """fingerprint the name and price shown for a product in a listing page, used to detect changed products
 
     Args:
-        url (str): the url to get the value from
-        first_splitter (str, optional): first character to split on. Defaults to '.'.
-        second_splitter (str, optional): second character to split on. Defaults to '-'.
+        item (dict[str, str]): the listing item as returned by get_listing_items
 
     Returns:
-        _type_: _description_
+        str | None: the fingerprint or None if neither name nor price were found
     """
-    base_name = os.path.basename(urlsplit(url).path)
-    return base_name.split(first_splitter)[0].split(second_splitter)[0].strip()
+    if item.get('name') is None and item.get('price') is None:
+        return None
+    return hashlib.sha1(f'{item.get("name")}|{item.get("price")}'.encode('utf-8')).hexdigest()
 
-def get_old_price(wd: webdriver.WebDriver):
-    """Get price of product when you reach the page before clicking on sub variants
+def get_validators(url: str, headers: dict[str, str]):
+    """get the http validators of a page with a HEAD request
 
     Args:
-        wd (webdriver.WebDriver): the driver to be used by this operation
+        url (str): the page to be validated
+        headers (dict[str, str]): headers of the browser session
 
     Returns:
-        str: the price of the product
+        dict[str, str]: etag and last_modified, None when the server does not send them
     """
     try:
-        return wd.find_element(By.CLASS_NAME, 'productPrice_price')
-    except NoSuchElementException:
-        return wd.find_element(By.CLASS_NAME, 'productPrice_fromPrice')
-    
-def rgb_to_hex(rgb: list):
-    """Convert rgb values to hex
+        response = http_request(url, headers, 'HEAD')
+    except urllib3.exceptions.HTTPError:
+        return {}
+    if response.status != 200:
+        return {}
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+def is_product_unchanged(task: dict[str, object], snapshot: dict[str, object], headers: dict[str, str]):
+    """check whether a product is unchanged since the snapshot using the listing fingerprint and, where available,
+    a conditional request with the stored http validators
 
     Args:
-        rgb (list): list of integers representing rgb values
+        task (dict[str, object]): the product task holding the listing fingerprint
+        snapshot (dict[str, object]): the product as stored in the snapshot
+        headers (dict[str, str]): headers of the browser session, conditional requests are skipped if None
 
     Returns:
-        str: the hex value prefixed with #
+        bool: True if the product can be carried forward from the snapshot
     """
-    return '#%02x%02x%02x' % (int(rgb[0]), int(rgb[1]), int(rgb[2]))
+    if task.get('fingerprint') is None or task['fingerprint'] != snapshot['fingerprint']:
+        return False
+    if headers is None or (snapshot['etag'] is None and snapshot['last_modified'] is None):
+        return True
+    conditional_headers = dict(headers)
+    if snapshot['etag'] is not None:
+        conditional_headers['If-None-Match'] = snapshot['etag']
+    if snapshot['last_modified'] is not None:
+        conditional_headers['If-Modified-Since'] = snapshot['last_modified']
+    try:
+        return http_request(task['url'], conditional_headers, 'HEAD').status == 304
+    except urllib3.exceptions.HTTPError:
+        logger.debug('Conditional request failed for URL: "%s". Trusting the listing fingerprint...', task['url'])
+        return True
 
-def get_multi_color_shade_option_details(wd: webdriver.WebDriver, product_details: dict[str, object], product_type: str) -> list[dict[str, object]]:
-    """get sub variants of multi color/shade/option product
+def enqueue_listing_page(wd: webdriver.WebDriver, task_queue: Queue, task: dict[str, object], store: CheckpointStore):
+    """load a listing page and push its product urls (and the remaining pages if this is the first page) to the task queue
 
     Args:
-        wd (webdriver.WebDriver): the chrome webdriver to be used for this operation
-        product_details (dict[str, object]): the parent product of the sub variants
-        product_type (str): the ProductType of the parent product
+        wd (webdriver.WebDriver): the chrome driver to be used by this operation
+        task_queue (Queue): the queue shared by all workers
+        task (dict[str, object]): the listing task to be processed
+        store (CheckpointStore): the store the processed page is recorded in
 
     Raises:
-        ValueError: if product type is not color/shade/option
+        TimeoutException: the page was not ready in time and shows no products, it is not recorded as processed
+    """
+    url, category, page = task['url'], task['category'], task['page']
+    load_page(wd, f'{url}?pageNumber={page}')
+    ready = wait_for_page_ready(wd, JAVASCRIPT_LISTING_PAGE_READY)
+    items = get_listing_items(wd)
+    if not ready and not items:
+        raise TimeoutException(f'Listing page {page} was not ready after {PAGE_READY_TIMEOUT_SEC} seconds.')
+    last_page = None
+    if page == 1:
+        last_page = get_last_page(wd, url)
+        logger.info('Category "%s" has %d pages.', category, last_page)
+        for next_page in range(2, last_page + 1):
+            task_queue.put({'type': TaskType.LISTING, 'url': url, 'category': category, 'page': next_page})
+    products = [{'url': item['url'], 'fingerprint': get_listing_fingerprint(item)} for item in items]
+    for product in products:
+        task_queue.put({'type': TaskType.PRODUCT, 'url': product['url'], 'category': category, 'fingerprint': product['fingerprint']})
+    store.save_listing_page(url, page, last_page, products)
+
+def fetch_listing_page(url: str, page: int, headers: dict[str, str]):
+    """get the products and the number of pages of a listing page from its raw html without a browser
+
+    Args:
+        url (str): link to the category listing
+        page (int): the page number
+        headers (dict[str, str]): headers of the browser session used for the request
 
     Returns:
-        list[dict[str, object]]: the sub variants of the parent product
+        tuple[int | None, list[dict[str, str]]] | None: the last page (None if the pagination is not present) and the url and fingerprint
+        of every unique product in page order, None if the page has to be loaded with selenium. A first page without pagination
+        is loaded with selenium too, it reads the real number of pages
     """
-    
-    variations = []
-    drop_down_list = wd.find_element(By.CLASS_NAME, 'athenaProductVariations_dropdown')
-    select = Select(drop_down_list)
-    i = 0
-    for option, id in [(x.text, x.get_attribute('value')) for x in select.options if x.text.casefold() != 'Please choose...'.casefold()]:
-        restart = True
-        restart_counter = 0
-        while restart:
-            variation_details = product_details.copy()
-            old_price = get_old_price(wd)
-            select = Select(wd.find_element(By.CLASS_NAME, 'athenaProductVariations_dropdown'))
-            select.select_by_visible_text(option)
-            try:
-                WebDriverWait(wd, 10).until(EC.staleness_of(old_price))
-            except Exception:
-                logger.debug(f'Could not find old price for url: "{product_details["product_url"]}", for value')
-            if product_type == ProductType.MULTI_COLOR:
-                variation_type = 'color'
-            elif product_type == ProductType.MULTI_SHADE:
-                variation_type = 'shade'
-            elif product_type == ProductType.MULTI_OPTION:
-                variation_type = 'option'
-            else:
-                raise ValueError(f'Invalid product type: {product_type}')
-            force_out_of_stock = False
-            if option.endswith('- Out of stock'):
-                force_out_of_stock = True
-            variation_details[variation_type] = option.removesuffix('- Out of stock').strip()
-            variation_details = get_variation_images(wd, variation_details)
-            if not variation_details.get('product_image_1', False):
-                logger.error(f'Could not find primary image from URL: "{variation_details["product_url"]}". Size: "{variation_details["size"]}"')
+    response = http_request(f'{url}?pageNumber={page}', headers)
+    if response.status != 200:
+        logger.debug('Got status %d for listing page %d of URL: "%s". Falling back to selenium...', response.status, page, url)
+        return None
+    parser = ListingPageParser()
+    parser.feed(response.data.decode('utf-8', errors='replace'))
+    parser.close()
+    items = {}
+    for item in parser.items:
+        if item['url']:
+            items.setdefault(urljoin(url, item['url']), item)
+    if not items:
+        logger.debug('Could not find products in listing page %d of URL: "%s". Falling back to selenium...', page, url)
+        return None
+    if page == 1 and parser.last_page is None:
+        logger.debug('Could not find the pagination of URL: "%s". Falling back to selenium...', url)
+        return None
+    return parser.last_page, [{'url': product_url, 'fingerprint': get_listing_fingerprint(item)} for product_url, item in items.items()]
+
+def discover_listing_pages(category_links: list[str], headers: dict[str, str], store: CheckpointStore, listing_pages: dict):
+    """fetch every listing page that was not processed yet concurrently over plain http: the first page of every category,
+    then the remaining pages once the number of pages is known. Pages that cannot be parsed are left for the selenium workers
+
+    Args:
+        category_links (list[str]): links to the category listings to be scraped
+        headers (dict[str, str]): headers of the browser session used for the requests
+        store (CheckpointStore): the store the processed pages are recorded in
+        listing_pages (dict): processed pages as returned by CheckpointStore.get_listing_pages, updated in place
+    """
+    def fetch(url: str, page: int):
+        try:
+            return fetch_listing_page(url, page, headers)
+        except (urllib3.exceptions.HTTPError, ValueError):
+            logger.warning('Could not fetch listing page %d of URL: "%s". Falling back to selenium...', page, url, exc_info=True)
+            return None
+
+    def fetch_pages(executor: ThreadPoolExecutor, pages: list[tuple[str, int]]):
+        futures = {executor.submit(fetch, url, page): (url, page) for url, page in pages if (url, page) not in listing_pages}
+        for future in as_completed(futures):
+            url, page = futures[future]
+            result = future.result()
+            if result is None:
                 continue
-            if any([x.get('product_image_1', '') == variation_details['product_image_1'] for x in variations]):
-                logger.warning('Variation image %d in URL: "%s", variation: "%s" is duplicated. Retrying fetch...', 
-                            i, variation_details['product_url'], get_variation_name(variation_details))
-                restart_counter += 1
-                if restart_counter > MAX_RETRY_VARIATION:
-                    logger.warning(f'Max fetch retry reached for URL: "{variation_details["product_url"]}, variation: {get_variation_name(variation_details)}". Skipping variation...')
-                    restart = False
+            last_page, products = result
+            last_page = last_page if page == 1 else None
+            store.save_listing_page(url, page, last_page, products)
+            listing_pages[(url, page)] = (last_page, products)
+        return len(futures)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(HTTP_POOL_SIZE) as executor:
+        fetched = fetch_pages(executor, [(url, 1) for url in category_links])
+        fetched += fetch_pages(executor, [(url, page) for url in category_links if (url, 1) in listing_pages
+                                          for page in range(2, listing_pages[(url, 1)][0] + 1)])
+    products = {product['url'] for (_, products) in listing_pages.values() for product in products}
+    logger.info('Requested %d listing pages over http in %.1f seconds. The catalog has %d unique products so far.', 
+                fetched, time.monotonic() - start, len(products))
+
+def seed_tasks(task_queue: Queue, category_links: list[str], store: CheckpointStore, resume = False, headers: dict[str, str] = None):
+    """push the initial tasks of the crawl. Listing pages are discovered over plain http when headers are given, the products
+    of every known page are merged into a frontier with one task per product url tagged with every category it is listed in.
+    Listing pages that are still unknown are queued for the selenium workers. When resuming, processed listing pages
+    are not loaded again and only the products that were not scraped yet are queued
+
+    Args:
+        task_queue (Queue): the queue shared by all workers
+        category_links (list[str]): links to the category listings to be scraped
+        store (CheckpointStore): the store holding the progress of the previous run
+        resume (bool, optional): continue the previous run instead of starting over. Defaults to False.
+        headers (dict[str, str], optional): headers of the prepared session, None to load every listing page with selenium. Defaults to None.
+    """
+    listing_pages = store.get_listing_pages() if resume else {}
+    skipped_pages = len(listing_pages)
+    scraped_products = store.get_scraped_products() if resume else set()
+    if DISCOVER_LISTINGS_OVER_HTTP and headers is not None:
+        discover_listing_pages(category_links, headers, store, listing_pages)
+    skipped_products = 0
+    frontier = {}
+    for url in category_links:
+        category = get_category_name(url)
+        if (url, 1) not in listing_pages:
+            task_queue.put({'type': TaskType.LISTING, 'url': url, 'category': category, 'page': 1})
+            continue
+        for page in range(1, listing_pages[(url, 1)][0] + 1):
+            if (url, page) not in listing_pages:
+                task_queue.put({'type': TaskType.LISTING, 'url': url, 'category': category, 'page': page})
                 continue
-                
-            restart = False
-            product_id = get_value_from_base_name(variation_details['product_image_1'])
-            variation_details = get_variation_misc_details(wd, variation_details, product_id, force_out_of_stock)
-
-            if product_type != ProductType.MULTI_OPTION:
-                color = wd.find_element(By.CSS_SELECTOR, f"span[data-value-id='{id}']").value_of_css_property('background-color')
-                color = Color.from_string(color).hex
-                variation_details[f'{variation_type}_hex'] = color
-            variations.append(variation_details)
-        i += 1
-    return variations
+            for product in listing_pages[(url, page)][1]:
+                if (product['url'], category) in scraped_products:
+                    skipped_products += 1
+                    continue
+                task = frontier.get(product['url'])
+                if task is None:
+                    frontier[product['url']] = {'type': TaskType.PRODUCT, 'url': product['url'], 'category': category, 
+                                                'fingerprint': product['fingerprint'], 'extra_categories': []}
+                elif category != task['category'] and category not in task['extra_categories']:
+                    task['extra_categories'].append(category)
+    for task in frontier.values():
+        task_queue.put(task)
+    logger.info('Queued %d unique products, %d of them listed in more than one category.', len(frontier), 
+                sum(bool(task['extra_categories']) for task in frontier.values()))
+    if resume:
+        logger.info('Resuming crawl. Skipping %d listing pages and %d products already scraped.', skipped_pages, skipped_products)
+
+@timed_stage('product')
+def process_product_task(wd: webdriver.WebDriver, task: dict[str, object], store: CheckpointStore, headers: dict[str, str], incremental = False):
+    """scrape a product and persist it. In incremental mode unchanged products are carried forward from the snapshot instead.
+    The other categories of a frontier task are recorded as memberships of the same product
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver to be used by this operation
+        task (dict[str, object]): the product task to be processed
+        store (CheckpointStore): the store the product is persisted to
+        headers (dict[str, str]): headers of the browser session used for plain http requests, None to disable them
+        incremental (bool, optional): skip the deep scrape of products unchanged since the snapshot. Defaults to False.
+
+    Returns:
+        str: a TaskOutcome, whether the product was scraped, carried forward or only recorded as a duplicate of another product
+    """
+    url, category = task['url'], task['category']
+    canonical_url = store.claim_product(url)
+    if canonical_url is not None:
+        outcome = TaskOutcome.DUPLICATE
+        store.save_membership(url, category, canonical_url)
+    else:
+        try:
+            outcome = scrape_claimed_product(wd, task, store, headers, incremental)
+            canonical_url = url
+        except DuplicateProductError as error:
+            outcome = TaskOutcome.DUPLICATE
+            canonical_url = error.canonical_url
+            store.redirect_product(url, canonical_url)
+            store.save_membership(url, category, canonical_url)
+        except Exception as error:
+            store.release_product(url)
+            for extra_category in task.get('extra_categories', []):
+                store.save_failed_product(url, extra_category, f'{type(error).__name__}: {str(error).strip()}')
+            raise
+    for extra_category in task.get('extra_categories', []):
+        store.save_membership(url, extra_category, canonical_url)
+    return outcome
+
+def scrape_claimed_product(wd: webdriver.WebDriver, task: dict[str, object], store: CheckpointStore, headers: dict[str, str], incremental = False):
+    """scrape or carry forward a product claimed by this worker and persist it
+
+    Args:
+        wd (webdriver.WebDriver): the chrome driver to be used by this operation
+        task (dict[str, object]): the product task to be processed
+        store (CheckpointStore): the store the product is persisted to
+        headers (dict[str, str]): headers of the browser session used for plain http requests, None to disable them
+        incremental (bool, optional): skip the deep scrape of products unchanged since the snapshot. Defaults to False.
+
+    Raises:
+        DuplicateProductError: the primary SKU of the product is already claimed by another product url
+        EmptyProductError: the product yielded no records, it is recorded as failed instead of scraped
 
-def create_serialized_sku(group:pd.Series, mask):
-    """Serialize a group of strings based on mask
+    Returns:
+        str: TaskOutcome.SCRAPED or TaskOutcome.UNCHANGED
+    """
+    url, category = task['url'], task['category']
+    if incremental:
+        snapshot = store.get_snapshot(url)
+        if snapshot is not None and is_product_unchanged(task, snapshot, headers):
+            canonical_url = store.claim_sku(snapshot['primary_SKU'], url)
+            if canonical_url is not None:
+                raise DuplicateProductError(canonical_url)
+            records = [{**record, 'product_category': category} for record in snapshot['records']]
+            store.save_product(url, category, records, task.get('fingerprint'), 
+                               {'etag': snapshot['etag'], 'last_modified': snapshot['last_modified']})
+            return TaskOutcome.UNCHANGED
+    records = scrape_product(wd, url, category, headers, store)
+    if not records:
+        raise EmptyProductError('Product yielded no records.')
+    if records[0].get('primary_SKU') is not None:
+        canonical_url = store.claim_sku(records[0]['primary_SKU'], url)
+        if canonical_url is not None:
+            raise DuplicateProductError(canonical_url)
+    validators = get_validators(url, headers) if incremental and headers is not None else None
+    store.save_product(url, category, records, task.get('fingerprint'), validators)
+    return TaskOutcome.SCRAPED
+
+def create_tab_pool(wd: webdriver.WebDriver, blocking_profile: dict[str, bool] = None, uses_plain_http = False):
+    """create the tab pool of a driver. Prefetching is disabled when products may be served without the browser
+    (http fast path or incremental mode) since their prefetched pages would be loaded for nothing
 
     Args:
-        group (pd.Series): the group of strings to be serialized
-        mask (pd.Series[bool]): a series of bools indicating the parent row to have the #1 serial number
+        wd (webdriver.WebDriver): the driver owning the tabs
+        blocking_profile (dict[str, bool], optional): resource groups blocked in the new tabs. Defaults to None (RESOURCE_BLOCKING).
+        uses_plain_http (bool, optional): products may be scraped without loading their page. Defaults to False.
 
     Returns:
-        pd.Series[tuple[str, str | pd.NA]]: a new series of tuples where each tuple contains the serialized string and the parent of this string if applicable
+        TabPool | None: the pool or None if a single tab is used
     """
-    count = 2
-    serialized_skus = []
-    for idx, row in group.items():
-        if mask[idx]:
-            serialized_skus.append((f"{row}-1", pd.NA))
-        else:
-            serialized_skus.append((f"{row}-{count}", row))
-            count += 1
-    return pd.Series(serialized_skus, index=group.index)
+    if TABS_PER_WORKER <= 1 or uses_plain_http:
+        return None
+    try:
+        return TabPool(wd, TABS_PER_WORKER, blocking_profile)
+    except WebDriverException:
+        logger.warning('Could not open %d tabs. Scraping with a single tab...', TABS_PER_WORKER, exc_info=True)
+        return None
 
-def get_product_variations_from_type(wd: webdriver.WebDriver, product_details: dict[str, object], url: str):
-    """get sub variants of product based on it's type
+def open_worker_driver(session: BrowserSession, uses_plain_http = False):
+    """start the driver of a worker together with its tab pool and reset its page count
 
     Args:
-        wd (webdriver.WebDriver): the chrome driver used for this operation
-        product_details (dict[str, object]): the parent product details
-        url (str): link to parent product
+        session (BrowserSession): the prepared session used to create the chrome driver
+        uses_plain_http (bool, optional): products may be scraped over plain http, the session headers are needed. Defaults to False.
 
     Returns:
-        list[dict[str, object]]: list of sub variants of parent product
+        tuple[webdriver.WebDriver | None, dict[str, str] | None]: the driver, None if the session could not be prepared,
+        and the session headers, None if plain http is not used
     """
-    variation_label = safe_get_element(wd, By.CLASS_NAME, 'athenaProductVariations_dropdownLabel')
-    product_variations = []
-    if variation_label is not None:
-        variation = variation_label.text.strip()
-        if variation.replace(' ', '').casefold() in color_variation_tags:
-            product_details['product_type'] = ProductType.MULTI_COLOR
-            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_COLOR)
-        elif variation.replace(' ', '').casefold() in shade_variation_tags:
-            product_details['product_type'] = ProductType.MULTI_SHADE
-            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_SHADE)
-        elif variation.replace(' ', '').casefold() in size_variation_tags:
-            product_details['product_type'] = ProductType.MULTI_SIZE
-            product_variations = get_multi_size_details(wd, product_details)
-        elif variation.replace(' ', '').casefold() in option_variation_tags:
-            product_details['product_type'] = ProductType.MULTI_OPTION
-            product_variations = get_multi_color_shade_option_details(wd, product_details, ProductType.MULTI_OPTION)
-        else:
-            logger.error(f'Unknown variant type: "{variation}". URL: {url}')
-    else:
-        product_details['product_type'] = ProductType.SINGLE
-        product_details = get_variation_images(wd, product_details)
-        if not product_details.get('product_image_1', False):
-            logger.error(f'Could not find primary image of single product from URL: "{product_details["product_url"]}".')
-            return product_variations
-        product_id = get_value_from_base_name(product_details['product_image_1'])
-        product_details = get_variation_misc_details(wd, product_details, product_id)
-        product_variations = [product_details]
-    return product_variations
+    global tab_pool, pages_loaded
+    pages_loaded = 0
+    wd = session.create_driver()
+    if wd is None:
+        return None, None
+    headers = session.get_headers(wd) if uses_plain_http else None
+    tab_pool = create_tab_pool(wd, session.blocking_profile, uses_plain_http)
+    return wd, headers
+
+def close_worker_driver(wd: webdriver.WebDriver):
+    """quit the driver of a worker and drop its tab pool, ignoring errors of a driver that was killed"""
+    global tab_pool
+    tab_pool = None
+    try:
+        wd.quit()
+    except Exception:
+        logger.debug('Could not quit the driver cleanly.', exc_info=True)
 
-def get_product_descriptions(wd: webdriver.WebDriver, product_details: dict[str, object]):
-    """get descriptions hidden by buttons for a product
+def scrape_worker(session: BrowserSession, task_queue: Queue, worker_index: int, store: CheckpointStore, incremental = False,
+                  shared_metrics: dict = None):
+    """Pull listing pages and product urls from the shared queue until a None sentinel is received. Every task runs under
+    a DriverWatchdog, a product running past PRODUCT_TIME_BUDGET_SEC is recorded as failed and an unresponsive driver is restarted.
+    The driver is also recycled between tasks once it loaded DRIVER_MAX_PAGES pages or its processes use DRIVER_MAX_RSS_MB of memory
 
     Args:
-        wd (webdriver.WebDriver): the chrome webdriver used for this operation
-        product_details (dict[str, object]): the product that we will get the descriptions for.
+        session (BrowserSession): the prepared session used to create the chrome driver
+        task_queue (Queue): the queue shared by all workers
+        worker_index (int): zero based index of this worker used for naming and progress bar placement
+        store (CheckpointStore): the store every scraped product and listing page is persisted to
+        incremental (bool, optional): carry forward products unchanged since the last run. Defaults to False.
+        shared_metrics (dict, optional): managed dict the metrics snapshot of this worker is published to, keyed by worker name. Defaults to None.
 
     Returns:
-        dict[str, object]: the updated product
+        int: number of products scraped by the driver
     """
-    for button in wd.find_elements(By.CLASS_NAME, 'productDescription_accordionControl'):
-        try:
-            if not button.text:
-                continue
-            button_id = button.get_attribute("id")
-            is_expanded = button.get_attribute('aria-expanded')
-            if is_expanded == 'false':
-                wd.execute_script(JAVASCRIPT_EXECUTE_CLICK, button)
-            description_content = wd.find_element(By.ID, button_id.replace('heading', 'content')).text
-            product_details[button.text] = description_content
-        except ElementNotInteractableException:
-            logger.debug(f'cannot click element with id: {button_id}')
-        except Exception:
-            logger.exception('Unexpected error occurred while getting product descriptions.', exc_info=True)
-        time.sleep(ACTION_DELAY_SEC)
-    
-    return product_details
+    global stage_metrics
+    worker = current_process()
+    worker.name = f'WORKER#{worker_index + 1}'
+    stage_metrics = StageMetrics(worker.name)
+    published_at = time.monotonic()
+    outcomes = dict.fromkeys([TaskOutcome.SCRAPED, TaskOutcome.UNCHANGED, TaskOutcome.DUPLICATE, TaskOutcome.FAILED], 0)
+    progress_bar = tqdm(total=0, colour='green', position=worker_index, desc=f'{worker.name} products scanned', unit='Products', leave=True)
+    uses_plain_http = USE_HTTP_FAST_PATH or incremental
+    wd, session_headers = open_worker_driver(session, uses_plain_http)
+    if wd is None:
+        logger.critical('Could not prepare session. Worker is exiting without consuming tasks...')
+        return 0
+    watchdog = DriverWatchdog()
+    watchdog.start()
+    pending = deque()
+    exhausted = False
+    try:
+        while True:
+            lookahead = len(tab_pool.handles) if tab_pool is not None else 1
+            while not exhausted and len(pending) < lookahead:
+                try:
+                    task = task_queue.get_nowait() if pending else task_queue.get()
+                except Empty:
+                    break
+                if task is None:
+                    exhausted = True
+                else:
+                    pending.append(task)
+            if not pending:
+                break
+            task = pending.popleft()
+            stage_metrics.category = task['category']
+            failed = False
+            watchdog.arm(wd)
+            try:
+                if tab_pool is not None:
+                    product_urls = [queued['url'] for queued in [task, *pending] if queued['type'] == TaskType.PRODUCT]
+                    claimed = store.get_claimed_products(product_urls) if product_urls else set()
+                    tab_pool.prefetch([url for url in product_urls if url not in claimed])
+                if task['type'] == TaskType.LISTING:
+                    enqueue_listing_page(wd, task_queue, task, store)
+                else:
+                    outcome = process_product_task(wd, task, store, session_headers, incremental)
+                    outcomes[outcome] += 1
+                    stage_metrics.increment(f'product_{outcome}')
+                    progress_bar.set_postfix({'category': task['category'], 'unchanged': outcomes[TaskOutcome.UNCHANGED], 
+                                              'duplicates': outcomes[TaskOutcome.DUPLICATE], 'failed': outcomes[TaskOutcome.FAILED]}, refresh=False)
+                    progress_bar.update()
+            except Exception as error:
+                failed = True
+                if isinstance(error, DeadlineExceededError) or watchdog.fired:
+                    logger.error('Task ran past its time budget of %s seconds: %s. Skipping...', PRODUCT_TIME_BUDGET_SEC, task)
+                elif isinstance(error, EmptyProductError):
+                    logger.error('Product yielded no records: %s. Recording it as failed...', task)
+                else:
+                    logger.exception('Unexpected error while processing task: %s.', task)
+                reason = f'{type(error).__name__}: {str(error).strip()}'
+                if task['type'] == TaskType.PRODUCT:
+                    outcomes[TaskOutcome.FAILED] += 1
+                    stage_metrics.increment(f'product_{TaskOutcome.FAILED}')
+                    store.save_failed_product(task['url'], task['category'], reason)
+                else:
+                    stage_metrics.increment('listing_failed')
+                    store.save_failed_listing_page(task['url'], task['page'], reason)
+            finally:
+                watchdog.disarm()
+                if tab_pool is not None:
+                    tab_pool.discard(task['url'])
+                task_queue.task_done()
+            # the watchdog may kill the driver just as a task succeeds, so its flag is checked after every task
+            unresponsive = watchdog.fired or (failed and not is_driver_responsive(wd, watchdog))
+            recycle_reason = None if unresponsive else get_recycle_reason(wd)
+            if unresponsive or recycle_reason:
+                if unresponsive:
+                    logger.warning('Driver is unresponsive. Restarting it...')
+                    stage_metrics.increment('driver_restart')
+                else:
+                    logger.info('Recycling the driver after %s...', recycle_reason)
+                    stage_metrics.increment('driver_recycle')
+                close_worker_driver(wd)
+                wd, session_headers = open_worker_driver(session, uses_plain_http)
+                if wd is None:
+                    logger.critical('Could not restart the driver. Worker is exiting and handing back %d tasks...', len(pending))
+                    break
+            if shared_metrics is not None and time.monotonic() - published_at > METRICS_EXPORT_INTERVAL_SEC / 2:
+                shared_metrics[worker.name] = stage_metrics.snapshot()
+                published_at = time.monotonic()
+    finally:
+        if shared_metrics is not None:
+            shared_metrics[worker.name] = stage_metrics.snapshot()
+        watchdog.stop()
+        for task in pending:
+            task_queue.put(task)
+            task_queue.task_done()
+        if wd is not None:
+            close_worker_driver(wd)
+    store.close()
+    logger.info('Worker finished. Scraped %d products, carried forward %d unchanged products, skipped %d duplicates and failed %d products.', 
+                outcomes[TaskOutcome.SCRAPED], outcomes[TaskOutcome.UNCHANGED], outcomes[TaskOutcome.DUPLICATE], outcomes[TaskOutcome.FAILED])
+    return outcomes[TaskOutcome.SCRAPED]
+
+def merge_metric_snapshots(snapshots: list[dict[str, list[dict[str, object]]]]):
+    """merge the metrics snapshots of several processes and summarize every stage across workers and categories
 
-def get_products_from_page(wd:webdriver.WebDriver, urls: list[str], product_category: str, progress_bar: tqdm):
-    """get product details of every url (product)
+    Args:
+        snapshots (list[dict[str, list[dict[str, object]]]]): snapshots as returned by StageMetrics.snapshot
+
+    Returns:
+        dict[str, object]: every histogram and counter plus a per stage summary and per event totals
+    """
+    merged = {'histograms': [], 'counters': [], 'stages': {}, 'events': {}}
+    for snapshot in snapshots:
+        merged['histograms'].extend(snapshot['histograms'])
+        merged['counters'].extend(snapshot['counters'])
+    for histogram in merged['histograms']:
+        stage = merged['stages'].setdefault(histogram['stage'], {'calls': 0, 'total_sec': 0.0, 'max_ms': 0.0})
+        stage['calls'] += histogram['count']
+        stage['total_sec'] += histogram['sum']
+        stage['max_ms'] = max(stage['max_ms'], histogram['max'] * 1000)
+    for stage in merged['stages'].values():
+        stage['mean_ms'] = stage['total_sec'] / stage['calls'] * 1000 if stage['calls'] else 0.0
+    for counter in merged['counters']:
+        merged['events'][counter['event']] = merged['events'].get(counter['event'], 0) + counter['value']
+    return merged
+
+def format_prometheus(merged: dict[str, object]):
+    """format merged metrics in the prometheus text exposition format
 
     Args:
-        wd (webdriver.WebDriver): the chrome webdriver to be used for scraping
-        urls (list[str]): urls representing multiple products in a single page
-        product_category (str): the category of all the products
-        progress_bar (tqdm): progress bar to be used for tracking scraping progress within the category
+        merged (dict[str, object]): metrics as returned by merge_metric_snapshots
 
     Returns:
-        pd.DataFrame: a data-frame containing all products scraped in this page
+        str: the stage histograms as cult_beauty_stage_seconds and the counters as cult_beauty_events_total
     """
-    df = pd.DataFrame()
-    # TODO add reset and leave = True
-    progress_bar.total = len(urls)
-    progress_bar.reset()
-    progress_bar.refresh()
-    for url in urls:
-        try:
-            wd.get(url)
-            product_details = {}
-            product_variations = []
-            product_details['product_url'] = url
-            product_details['product_category'] = product_category
-            brand_element = safe_get_element(wd, By.CLASS_NAME, 'productBrandLogo_image')
-
-            product_details['brand_name'] = brand_element.get_attribute('title') if brand_element is not None else None
-            product_details['brand_logo'] = brand_element.get_attribute('src') if brand_element is not None else None
-
-            primary_sku = wait_for_presence_get(wd, By.CLASS_NAME, 'athenaProductImageCarousel_image')
-            primary_sku = get_attribute_retry_stale(wd, primary_sku, 'src', product_details, By.CLASS_NAME, 'athenaProductImageCarousel_image',
-                                                    label = 'Primary SKU')
-            if primary_sku is None:
-                logger.error('Could not find primary SKU for URL: "%s". Skipping...', url)
-                continue
-            product_details['primary_SKU'] = get_value_from_base_name(primary_sku)
-            product_details = get_product_descriptions(wd, product_details)
-            product_variations = get_product_variations_from_type(wd, product_details, url)
-            df = pd.concat([df, pd.DataFrame(product_variations)], ignore_index=True)
-            time.sleep(ACTION_DELAY_SEC)
-        except Exception:
-            logger.exception(f'Unexpected error with trying to fetch data in url "{url}".', exc_info=True)
-        time.sleep(ACTION_DELAY_SEC)
-        progress_bar.update()
+    def labels(**values):
+        escaped = {key: str(value or '').replace('\\', '\\\\').replace('"', '\\"') for key, value in values.items()}
+        return ','.join(f'{key}="{value}"' for key, value in escaped.items())
+    lines = ['# HELP cult_beauty_stage_seconds Wall time of the scraping stages.', '# TYPE cult_beauty_stage_seconds histogram']
+    for histogram in merged['histograms']:
+        series = labels(stage=histogram['stage'], worker=histogram['worker'], category=histogram['category'])
+        cumulative = 0
+        for bound, count in zip(METRICS_BUCKETS_SEC, histogram['buckets']):
+            cumulative += count
+            lines.append(f'cult_beauty_stage_seconds_bucket{{{series},le="{bound}"}} {cumulative}')
+        lines.append(f'cult_beauty_stage_seconds_bucket{{{series},le="+Inf"}} {histogram["count"]}')
+        lines.append(f'cult_beauty_stage_seconds_sum{{{series}}} {histogram["sum"]}')
+        lines.append(f'cult_beauty_stage_seconds_count{{{series}}} {histogram["count"]}')
+    lines += ['# HELP cult_beauty_events_total Retries, timeouts and product outcomes.', '# TYPE cult_beauty_events_total counter']
+    for counter in merged['counters']:
+        lines.append(f'cult_beauty_events_total{{{labels(event=counter["event"], worker=counter["worker"], category=counter["category"])}}} '
+                     f'{counter["value"]}')
+    return '\n'.join(lines) + '\n'
+
+def export_metrics(snapshots: list[dict[str, list[dict[str, object]]]], path: str = None):
+    """merge the metrics snapshots of every process and write them as json and prometheus text, replacing the previous files atomically
 
-    return df
+    Args:
+        snapshots (list[dict[str, list[dict[str, object]]]]): snapshots as returned by StageMetrics.snapshot
+        path (str, optional): path of the files without extension. Defaults to None (METRICS_PATH).
 
-def scrape_category_url(browser_options: options.Options, url: str):
-    """Scrapes every page of the given cult_beauty category url
+    Returns:
+        dict[str, object]: the merged metrics
+    """
+    path = METRICS_PATH if path is None else path
+    merged = merge_metric_snapshots(snapshots)
+    merged['exported_at'] = time.time()
+    for extension, content in [('.json', json.dumps(merged, indent=2)), ('.prom', format_prometheus(merged))]:
+        with open(f'{path}{extension}.tmp', 'w') as output:
+            output.write(content)
+        os.replace(f'{path}{extension}.tmp', f'{path}{extension}')
+    return merged
+
+def wait_for_tasks(task_queue: Queue, futures: list[Future], shared_metrics: dict = None):
+    """block until every task in the queue is processed or every worker has exited, exporting the metrics
+    published by the workers every METRICS_EXPORT_INTERVAL_SEC
 
     Args:
-        browser_options (options.Options): options to be used by the chrome webdriver
-        url (str): the url to be scraped
+        task_queue (Queue): the queue shared by all workers
+        futures (list[Future]): the running workers
+        shared_metrics (dict, optional): managed dict the workers publish their metrics snapshots to. Defaults to None.
 
     Returns:
-        pd.DataFrame: a data-frame containing all products scraped by the driver
+        bool: True if the queue was fully processed, False if all workers exited early
     """
-    worker = current_process()
-    current_process_id = worker._identity[0]
-    category_name = get_value_from_base_name(url, second_splitter=' ').replace('-', ' ')
-    worker.name = f'WORKER#{current_process_id}_{category_name}'
-    progress_bar_position = (current_process_id - 1) * 2
-    with webdriver.WebDriver(browser_options) as wd:
-        wd.get(f'{url}')
-        time.sleep(ACTION_DELAY_SEC)
-        wait_for_presence_get(wd, By.ID, 'onetrust-accept-btn-handler', wait_for=10, must_be_visible=True).click()
-        wait_for_presence_get(wd ,By.CSS_SELECTOR, 
-                          'body > div.emailReengagement > div > div.emailReengagement_form_container > button > svg > path'
-                          , wait_for= 10, must_be_visible=True).click()
-        product_details = pd.DataFrame()
-        if not change_currency(wd, '€ (EUR)'):
-            logger.critical('Could not change currency for category: "%s". URL "%s". Skipping category...', category_name, url)
-            return product_details
-        logger.info('Currency changed successfully for category: "%s"', category_name)
-        last_page = wait_for_presence_get(wd, By.CSS_SELECTOR, 'a.responsivePaginationButton.responsivePageSelector.responsivePaginationButton--last')
-        if last_page is not None:
-            last_page = get_attribute_retry_stale(wd, last_page, 'textContent', {}, By.CSS_SELECTOR, 
-                                                  'a.responsivePaginationButton.responsivePageSelector.responsivePaginationButton--last'
-                                                  , label='Last Page button')
-            if last_page is None:
-                logger.warning('Could not find last page button for URL: "%s". Assuming 1 page...', url)
-                last_page = 1
-            else:
-                last_page = int(last_page)
-        inner_bar = tqdm(total=0, colour='green', position=progress_bar_position + 1, desc='Products scanned', unit='Products', leave=True)
-        for page in tqdm(range(1, last_page + 1), colour='red', position= progress_bar_position, desc='Pages scanned', unit='Pages', postfix = {'category': category_name}, leave=True):
-            wd.get(f'{url}?pageNumber={page}')
-            product_links = list(set([x.find_element(By.CLASS_NAME, 'productBlock_link').get_attribute('href') for x in wd.find_elements(By.CLASS_NAME, 'productBlock_itemDetails_wrapper')]))
-            product_details = pd.concat([product_details, get_products_from_page(wd, product_links, category_name, inner_bar)], ignore_index=True)
-            time.sleep(ACTION_DELAY_SEC)
-        return product_details
+    drained = threading.Thread(target=task_queue.join, daemon=True)
+    drained.start()
+    exported_at = time.monotonic()
+    while drained.is_alive():
+        if all(future.done() for future in futures):
+            logger.error('All workers exited before the task queue was processed.')
+            return False
+        drained.join(timeout=1)
+        if shared_metrics is not None and time.monotonic() - exported_at > METRICS_EXPORT_INTERVAL_SEC:
+            try:
+                export_metrics(list(shared_metrics.values()))
+            except OSError:
+                logger.warning('Could not export metrics to "%s".', METRICS_PATH, exc_info=True)
+            exported_at = time.monotonic()
+    return True
 
 def order_serialized_columns(columns: list[str], regex = r'_(\d+)'):
     """Order subset of list where elements share the same prefix and a numeral suffix
@@ -693,219 +3121,490 @@ def order_serialized_columns(columns: list[str], regex = r'_(\d+)'):
 
     return ordered_columns
 
-def find_with_pattern(text: str, pattern = r'range:\n+([a-z ]+)', capture_group = 1, default= pd.NA):
-    """Find and return substring of text using regex pattern
+def strip_strings(column: pd.Series):
+    """strip every string of a column leaving the other values untouched
 
     Args:
-        text (str): Source text that will be searched on
-        pattern (regexp, optional): Pattern used for searching. Defaults to r'range:\n+([a-z ]+)'.
-        capture_group (int, optional): regex capture group to be returned when found. Defaults to 1.
-        default (_type_, optional): value to be returned if no match is found. Defaults to pd.NA.
+        column (pd.Series): the column to be stripped
 
     Returns:
-        str | default: Found match or default if no match found
+        pd.Series: the stripped column
     """
-    if pd.isna(text):
-        return default
-    match = re.search(pattern, text, flags=re.IGNORECASE)
-    if match is None:
-        return default
-    result = match.group(capture_group)
-    if result is None:
-        return default
-    return result
+    if column.dtype != object:
+        return column
+    try:
+        stripped = column.str.strip()
+    except AttributeError:
+        return column
+    return stripped.where(stripped.notna(), column)
+
+def get_excluded_variants(df: pd.DataFrame):
+    """flag refill options and gift vouchers using the first non null option, color, size or shade of every row
+
+    Args:
+        df (pd.DataFrame): the sub variants
+
+    Returns:
+        pd.Series[bool]: True for the rows to be dropped
+    """
+    combined_variants = df.reindex(columns=['option', 'color', 'size', 'shade']).astype(object).bfill(axis=1).iloc[:, 0]
+    return combined_variants.str.contains(EXCLUDED_VARIANTS_PATTERN, na=False)
+
+def get_shipping_flags(descriptions: pd.Series):
+    """flag descriptions containing the shipping restriction message
+
+    Args:
+        descriptions (pd.Series): the product descriptions
+
+    Returns:
+        pd.Series[str]: 'no' if the product does not ship to bahrain or has no description, 'yes' otherwise
+    """
+    restricted = descriptions.astype(object).str.contains(SHIPPING_RESTRICTION_PATTERN, na=True)
+    return restricted.map({True: 'no', False: 'yes'})
 
-def first_not_null(items: pd.Series):
-    """Get first non-null entry in series
+def capitalize_brand_names(brand_names: pd.Series):
+    """capitalize every word of the brand names written in full upper case
 
     Args:
-        items (pd.Series): The series of items to search on
+        brand_names (pd.Series): the brand names
 
     Returns:
-        Any | pd.NA: first non-null item or pd.NA if none found
+        pd.Series: the brand names with NA for missing ones
     """
-    return next((x for x in items if not pd.isna(x)), pd.NA)
+    brand_names = brand_names.astype(object)
+    full_upper = brand_names.str.isupper().fillna(False).astype(bool)
+    capitalized = brand_names[full_upper].str.lower().str.replace(WORD_START_PATTERN, lambda match: match.group(0).title(), regex=True)
+    return brand_names.mask(full_upper, capitalized).where(brand_names.notna(), pd.NA)
 
-def pattern_found(text: str, pattern = r'we regret.+(?:middle east|bahrain)', negative_return = 'no', positive_return = 'yes'):
-    """Search for pattern in text and return value based on it's existence
+def remove_brand_names(product_names: pd.Series, brand_names: pd.Series):
+    """remove the brand name prefix of product names, the prefix is matched ignoring case
 
     Args:
-        text (str): Source text to search on
-        pattern (regexp, optional): Pattern to use for searching. Defaults to r'we regret.+(?:middle east|bahrain)'.
-        negative_return (str, optional): Value to return if pattern is not found. Defaults to 'no'.
-        positive_return (str, optional): Value to return if pattern is found. Defaults to 'yes'.
+        product_names (pd.Series): the product names
+        brand_names (pd.Series): the brand name of every product name
 
     Returns:
-        Any: positive_return | negative_return
+        pd.Series: the product names without the brand prefix
     """
-    if pd.isna(text):
-        return negative_return
-    found = re.search(pattern, text, flags=re.IGNORECASE)
-    if found is None:
-        return positive_return
-    return negative_return
+    index = product_names.index
+    product_names = product_names.astype(object).reset_index(drop=True)
+    brand_names = brand_names.astype(object).reset_index(drop=True)
+    result = product_names.copy()
+    has_both = brand_names.notna() & product_names.notna()
+    for brand, names in product_names[has_both].groupby(brand_names[has_both], sort=False):
+        names = names[names.str.casefold().str.startswith(brand.casefold())]
+        result[names.index] = names.str.removeprefix(brand).str.strip()
+    result.index = index
+    return result
 
-def remove_pattern(text: str, pattern = r'we regret.+(?:middle east|bahrain)'):
-    """Remove substrings from text based on a regex pattern  
+def extract_range(product_details: pd.Series):
+    """extract the product range from the product details
 
     Args:
-        text (str): source text
-        pattern (regexp, optional): Pattern to use for removing substrings. Defaults to r'we regret.+(?:middle east|bahrain)'.
+        product_details (pd.Series): the product details texts
 
     Returns:
-        str | pd.NA: the modified text or NA if text is None
+        pd.Series: the range or NA if not found
     """
-    if pd.isna(text):
-        return text
-    return re.sub(pattern, '', text, flags=re.IGNORECASE)
+    return product_details.astype(object).str.extract(RANGE_PATTERN, expand=False).astype(object).fillna(pd.NA)
 
-def remove_brand_name(row: pd.Series):
-    """Remove brand_name from product_name for a single row
+def to_categorical(tables: dict[str, pd.DataFrame]):
+    """convert the repeated string columns of normalized tables listed in CATEGORICAL_COLUMNS to categoricals
 
     Args:
-        row (pd.Series): The data-frame row to be modified
+        tables (dict[str, pd.DataFrame]): the normalized tables
 
     Returns:
-        pd.Series: The new product_name after removing brand_name prefix
+        dict[str, pd.DataFrame]: the converted tables
     """
-    if (any((pd.isna(x) for x in row.values))):
-        return row['product_name']
-    if not (row['product_name'].casefold().startswith(row['brand_name'].casefold())):
-        return row['product_name']
-    new_product_name = row['product_name'].removeprefix(row['brand_name']).strip()
-    return new_product_name
+    return {name: table.astype({column: 'category' for column in CATEGORICAL_COLUMNS.get(name, []) if column in table.columns})
+            for name, table in tables.items()}
 
+def from_categorical(table: pd.DataFrame):
+    return table.astype({column: object for column in table.columns if isinstance(table[column].dtype, pd.CategoricalDtype)})
 
-def capitalize_words(text: str, full_upper_only = True):
-    """Capitalizes every word in input text
+def to_wide_frame(tables: dict[str, pd.DataFrame], columns: list[str] = None):
+    """derive the wide layout (one row per variant with a column per image and per description heading) from normalized tables
 
     Args:
-        text (str): string to be capitalized
-        full_upper_only (bool, optional): only perform operation if all characters in input are uppercase. Defaults to True.
+        tables (dict[str, pd.DataFrame]): the normalized tables as returned by RecordSink.to_tables or postprocess_tables
+        columns (list[str], optional): record keys in the order of the scraped data-frame (RecordSink.get_columns), 
+        the columns follow that order like the wide layout does. Defaults to None (the order of the joined tables).
 
     Returns:
-        str | pd.NA: the string with modifications or NA if input is None
+        pd.DataFrame: the wide data-frame with its columns reordered
     """
-    if pd.isna(text):
-        return pd.NA
-    if not text.isupper() and full_upper_only:
-        return text
-    new_text = text.lower()
-    words = new_text.split(' ')
-    words = [x.capitalize() for x in words]
-    return ' '.join(words)
+    products, variants, images, descriptions = (from_categorical(tables[name]) for name in ['products', 'variants', 'images', 'descriptions'])
+    wide = variants.merge(products, on='primary_SKU', how='left')
+    image_columns = images.pivot(index='variant_SKU', columns='position', values='url').rename(columns=lambda position: f'product_image_{position}')
+    description_columns = descriptions.pivot(index='primary_SKU', columns='heading', values='text')
+    wide = wide.join(image_columns, on='variant_SKU').join(description_columns, on='primary_SKU')
+    ordered = [] if columns is None else [column for column in order_serialized_columns(columns) if column in wide.columns]
+    ordered += [column for column in wide.columns if column not in ordered]
+    return wide.reindex(order_serialized_columns(ordered), axis=1)
+
+def postprocess_tables(tables: dict[str, pd.DataFrame], store: CheckpointStore = None):
+    """apply the cleanup of postprocess to normalized tables. Product level columns (ships_to_bahrain and Range)
+    are added to the products table and the descriptions keep one row per heading
 
-def main():
-    start_time = time.time()
-    df = pd.DataFrame()
-    with ProcessPoolExecutor(max_workers=NUM_OF_WORKERS, initializer=tqdm.set_lock, initargs=(tqdm.get_lock(),)) as executor:
-        
-        results = executor.map(scrape_category_url, [browser_options for _ in CATEGORY_LINKS],CATEGORY_LINKS)
-        
-        for result in results:
-            df = pd.concat([df, result], ignore_index=True)
-        
-        logger.info(f'Total data-frame shape: {df.shape}')
+    Args:
+        tables (dict[str, pd.DataFrame]): the normalized tables as returned by RecordSink.to_tables
+        store (CheckpointStore, optional): store used as a persistent cache of detected languages. Defaults to None.
+
+    Returns:
+        dict[str, pd.DataFrame]: the cleaned tables
+    """
+    products, variants, images, descriptions = (from_categorical(tables[name]) for name in ['products', 'variants', 'images', 'descriptions'])
 
-        logger.info('Renaming product_type column...')
-        df.rename({'product_type':'variant_type'}, inplace=True)
+    logger.info("Removing duplicate variants...")
+    variants = variants.drop_duplicates(subset='variant_SKU', ignore_index=True).copy()
+    logger.info('Total variants after deduplication: %d', len(variants))
 
-        logger.info('Reordering columns...')
-        df = df.reindex(order_serialized_columns(df.columns), axis=1)
+    logger.info("Serializing primary SKU...")
+    variants[['serialized_primary_SKU', 'is_variant_of']] = create_serialized_sku(variants)
 
-        logger.info("Exporting excel with duplicates...")
-        df.to_excel('./test_cult_beauty_with_duplicates.xlsx', index=False)
+    logger.info("Cleaning price column...")
+    variants['price'] = variants['price'].str.replace(PRICE_JUNK_PATTERN, '', regex=True)
+    variants = variants.dropna(axis=1, how='all')
 
-        logger.info("Removing duplicate entries...")
-        df.drop_duplicates(subset='variant_SKU', inplace=True, ignore_index=True)
+    logger.info('Removing refill options and gift vouchers...')
+    variants = variants.loc[~get_excluded_variants(variants)].reset_index(drop=True)
+    products = products.loc[products['primary_SKU'].isin(variants['primary_SKU'])].reset_index(drop=True)
+    images = images.loc[images['variant_SKU'].isin(variants['variant_SKU'])].reset_index(drop=True)
+    descriptions = descriptions.loc[descriptions['primary_SKU'].isin(products['primary_SKU'])
+                                    & (descriptions['heading'] != "Why It's Cult")].reset_index(drop=True)
 
-        logger.info('Total data-frame shape after deduplication: %s', df.shape)
+    logger.info('Creating ships to bahrain column.')
+    headings = descriptions.set_index(['heading', 'primary_SKU'])['text']
+    products['ships_to_bahrain'] = get_shipping_flags(products['primary_SKU'].map(headings.get('Description', pd.Series(dtype=object))))
 
-        mask = df['primary_SKU'] == df['variant_SKU']
-        transform = df.groupby('primary_SKU')['primary_SKU'].transform(create_serialized_sku, mask)
-        logger.info("Serializing primary SKU...")
-        df[['serialized_primary_SKU', 'is_variant_of']] = pd.DataFrame(transform.to_list(), columns=['serialized_primary_SKU', 'is_variant_of']
-                                                                    , index=transform.index)
-        
-        logger.info("Cleaning price column...")
-        df['price'] = df['price'].transform(lambda x: re.sub(r'[^\d.]', '', x))
+    logger.info('Removing regret message from description...')
+    is_description = descriptions['heading'] == 'Description'
+    descriptions.loc[is_description, 'text'] = descriptions.loc[is_description, 'text'].str.replace(SHIPPING_REGRET_MESSAGE_PATTERN, '', regex=True)
 
-        logger.info("Dropping empty columns...")
-        df.dropna(axis=1, how='all', inplace=True)
+    logger.info('Fixing brand name capitalization...')
+    products['brand_name'] = capitalize_brand_names(products['brand_name'])
 
-        logger.info('Removing refill options...')
-        combined_variants = df[['option', 'color', 'size', 'shade']].apply(first_not_null, axis= 1)
-        mask = df.loc[(~pd.isna(combined_variants)) & combined_variants.str.contains('refill', case=False)].index
-        df.drop(mask, inplace=True)
+    logger.info('Removing brand name from product name...')
+    variants['product_name'] = remove_brand_names(variants['product_name'],
+                                                  variants['primary_SKU'].map(products.set_index('primary_SKU')['brand_name']))
 
-        logger.info("Removing gift vouchers...")
-        mask = df.loc[(~pd.isna(combined_variants)) & combined_variants.str.contains('€', case=False)].index
-        df.drop(mask, inplace=True)
+    logger.info('Replacing shop all with tanning suncare')
+    variants['product_category'] = variants['product_category'].mask(variants['product_category'] == 'shop all', 'tanning suncare')
 
-        logger.info('Dropping why it\'s cult...')
-        why_its_cult = "Why It's Cult"
-        df.drop(why_its_cult, axis=1, inplace=True)
+    logger.info('Replacing Product Details with Range...')
+    products['Range'] = extract_range(products['primary_SKU'].map(headings.get('Product Details', pd.Series(dtype=object))))
+    descriptions = descriptions.loc[descriptions['heading'] != 'Product Details'].reset_index(drop=True)
 
-        logger.info('Creating ships to bahrain column.')
-        df['ships_to_bahrain'] = df['Description'].transform(pattern_found)
+    logger.info('Stripping all strings...')
+    products, variants, images, descriptions = (table.apply(strip_strings) for table in [products, variants, images, descriptions])
 
-        logger.info('Removing regret message from description...')
-        df['Description'] = df['Description'].transform(remove_pattern, pattern=r'we regret we (?:can\'t|cannot) ship.+')
+    logger.info('Dropping all non english descriptions and how to use...')
+    for heading in ['Description', 'How to Use']:
+        is_heading = descriptions['heading'] == heading
+        descriptions.loc[is_heading, 'text'] = filter_language(descriptions.loc[is_heading, 'text'], store=store)
 
-        logger.info('Fixing brand name capitalization...')
-        df['brand_name'] = df['brand_name'].transform(capitalize_words)
+    return to_categorical({'products': products, 'variants': variants, 'images': images, 'descriptions': descriptions})
 
-        logger.info('Removing brand name from product name...')
-        df['product_name'] = df[['brand_name', 'product_name']].apply(remove_brand_name, axis=1)
+def postprocess(df: pd.DataFrame, store: CheckpointStore = None):
+    """clean the scraped sub variants with vectorized string operations: deduplicate, serialize SKUs, clean prices,
+    drop refills and gift vouchers, flag shipping restrictions, tidy brand and product names, extract the range
+    and keep english descriptions only
 
-        logger.info('Replacing shop all with tanning suncare')
-        df['product_category'] = df['product_category'].transform(lambda x: 'tanning suncare' if x == 'shop all' else x)
+    Args:
+        df (pd.DataFrame): the scraped sub variants, one row per sub variant
+        store (CheckpointStore, optional): store used as a persistent cache of detected languages. Defaults to None.
+
+    Returns:
+        pd.DataFrame: the cleaned data-frame with its columns reordered
+    """
+    logger.info("Removing duplicate entries...")
+    df = df.drop_duplicates(subset='variant_SKU', ignore_index=True).copy()
+    logger.info('Total data-frame shape after deduplication: %s', df.shape)
+
+    logger.info("Serializing primary SKU...")
+    df[['serialized_primary_SKU', 'is_variant_of']] = create_serialized_sku(df)
+
+    logger.info("Cleaning price column...")
+    df['price'] = df['price'].str.replace(PRICE_JUNK_PATTERN, '', regex=True)
+
+    logger.info("Dropping empty columns...")
+    df = df.dropna(axis=1, how='all')
+
+    logger.info('Removing refill options and gift vouchers...')
+    df = df.loc[~get_excluded_variants(df)]
+
+    logger.info('Dropping why it\'s cult...')
+    df = df.drop(columns="Why It's Cult")
+
+    logger.info('Creating ships to bahrain column.')
+    df['ships_to_bahrain'] = get_shipping_flags(df['Description'])
+
+    logger.info('Removing regret message from description...')
+    df['Description'] = df['Description'].str.replace(SHIPPING_REGRET_MESSAGE_PATTERN, '', regex=True)
+
+    logger.info('Fixing brand name capitalization...')
+    df['brand_name'] = capitalize_brand_names(df['brand_name'])
+
+    logger.info('Removing brand name from product name...')
+    df['product_name'] = remove_brand_names(df['product_name'], df['brand_name'])
+
+    logger.info('Replacing shop all with tanning suncare')
+    df['product_category'] = df['product_category'].mask(df['product_category'] == 'shop all', 'tanning suncare')
+
+    logger.info('Replacing Product Details with Range...')
+    df['Range'] = extract_range(df['Product Details'])
+
+    logger.info('Dropping Product Detail column...')
+    df = df.drop(columns='Product Details')
+
+    logger.info('Stripping all strings in data-frame...')
+    df = df.apply(strip_strings)
+
+    logger.info('Dropping all non english cells from description...')
+    df['Description'] = filter_language(df['Description'], store=store)
+
+    logger.info('Dropping all non english cells from how to use...')
+    df['How to Use'] = filter_language(df['How to Use'], store=store)
+
+    logger.info('Reordering columns...')
+    return df.reindex(order_serialized_columns(df.columns), axis=1)
+
+def prepare_for_export(df: pd.DataFrame):
+    """convert the object columns mixing several python types to strings so they have a single columnar type
+
+    Args:
+        df (pd.DataFrame): the data-frame to be exported
+
+    Returns:
+        pd.DataFrame: the converted data-frame
+    """
+    mixed = [column for column in df.columns if df[column].dtype == object
+             and pd.api.types.infer_dtype(df[column], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    return df.assign(**{column: df[column].map(str).where(df[column].notna(), None) for column in mixed})
+
+def iter_chunks(df: pd.DataFrame):
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+def export_parquet(df: pd.DataFrame, path: str):
+    """write a data-frame to a parquet file, one row group per chunk"""
+    schema = pyarrow.Schema.from_pandas(df, preserve_index=False)
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(df):
+            writer.write_table(pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def export_feather(df: pd.DataFrame, path: str):
+    """write a data-frame to a feather (arrow ipc) file, one record batch per chunk"""
+    schema = pyarrow.Schema.from_pandas(df, preserve_index=False)
+    with pyarrow.ipc.new_file(path, schema, options=pyarrow.ipc.IpcWriteOptions(compression='zstd')) as writer:
+        for chunk in iter_chunks(df):
+            writer.write_table(pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+def export_csv(df: pd.DataFrame, path: str):
+    """write a data-frame to a gzip compressed csv file chunk by chunk"""
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as output:
+        for i, chunk in enumerate(iter_chunks(df)):
+            chunk.to_csv(output, header=i == 0, index=False)
+
+EXPORTERS = {'parquet': export_parquet, 'feather': export_feather, 'csv': export_csv}
+
+def get_export_formats(formats: list[str] = None):
+    """validate the requested export formats, the arrow based ones are replaced by csv when pyarrow is not installed
+
+    Args:
+        formats (list[str], optional): formats of EXPORTERS. Defaults to None (parquet, or csv without pyarrow).
+
+    Returns:
+        list[str]: the formats to be written
+    """
+    if not formats:
+        formats = ['parquet']
+    if pyarrow is None and any(x in ('parquet', 'feather') for x in formats):
+        logger.error('pyarrow is not installed. Exporting compressed csv instead of parquet/feather.')
+        formats = [x for x in formats if x not in ('parquet', 'feather')] or ['csv']
+    return list(dict.fromkeys(formats))
+
+def export_frame(df: pd.DataFrame, base_path: str, formats: list[str]):
+    """write a data-frame in every requested format
 
-        logger.info('Replacing Product Details with Range...')
-        df['Range'] = df['Product Details'].transform(find_with_pattern)
+    Args:
+        df (pd.DataFrame): the data-frame to be exported
+        base_path (str): path of the output without extension
+        formats (list[str]): formats of EXPORTERS
+
+    Returns:
+        list[str]: the written files in the order of formats
+    """
+    df = prepare_for_export(df)
+    paths = []
+    for export_format in formats:
+        path = f'{base_path}{EXPORT_EXTENSIONS[export_format]}'
+        start = time.time()
+        EXPORTERS[export_format](df, path)
+        logger.info('Exported %d rows to "%s" in %.1f seconds.', len(df), path, time.time() - start)
+        paths.append(path)
+    return paths
+
+def read_export(path: str):
+    """load a file written by export_frame
+
+    Args:
+        path (str): the exported file
+
+    Returns:
+        pd.DataFrame: the loaded data-frame
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return pd.read_csv(path, compression='gzip')
 
-        logger.info('Dropping Product Detail column...')
-        df.drop(columns='Product Details', inplace=True)
+def export_excel(sources: dict[str, str], path: str):
+    """derive an excel workbook from exported files, one sheet per file. Files longer than the excel row limit
+    are split over several sheets
 
-        logger.info('Stripping all strings in data-frame...')
-        df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    Args:
+        sources (dict[str, str]): exported file keyed by sheet name
+        path (str): location of the workbook
+    """
+    start = time.time()
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name, source in sources.items():
+            df = read_export(source)
+            for i, first_row in enumerate(range(0, max(len(df), 1), EXCEL_MAX_ROWS)):
+                df.iloc[first_row:first_row + EXCEL_MAX_ROWS].to_excel(writer, sheet_name=sheet_name if i == 0 else f'{sheet_name}_{i + 1}',
+                                                                       index=False)
+    logger.info('Exported excel workbook "%s" in %.1f seconds.', path, time.time() - start)
+
+def export_output(df: pd.DataFrame, base_path: str, formats: list[str], excel = False):
+    """write a data-frame in every requested format and optionally derive an excel workbook from the first one
 
-        logger.info('Dropping all non english cells from description...')
-        df['Description'] = df['Description'].transform(confirm_language)
+    Args:
+        df (pd.DataFrame): the data-frame to be exported
+        base_path (str): path of the outputs without extension
+        formats (list[str]): formats of EXPORTERS
+        excel (bool, optional): also write base_path.xlsx. Defaults to False.
+    """
+    paths = export_frame(df, base_path, formats)
+    if excel:
+        export_excel({'Sheet1': paths[0]}, f'{base_path}.xlsx')
 
-        logger.info('Dropping all non english cells from how to use...')
-        df['How to Use'] = df['How to Use'].transform(confirm_language)
+def scrape_categories(category_links: list[str], num_of_workers: int, store: CheckpointStore, resume = False, incremental = False):
+    """Scrape every product of the given categories using a pool of workers sharing one task queue
 
-        logger.info('Reordering columns...')
-        df = df.reindex(order_serialized_columns(df.columns), axis=1)
+    Args:
+        category_links (list[str]): links to the category listings to be scraped
+        num_of_workers (int): number of chrome workers to be started
+        store (CheckpointStore): the store every scraped product and listing page is persisted to
+        resume (bool, optional): skip the listing pages and products already in the store. Defaults to False.
+        incremental (bool, optional): only deep scrape products that are new or changed since the last finished run. Defaults to False.
 
-        logger.info("Exporting excel without duplicates...")
-        df.to_excel('./test_cult_beauty_without_duplicates.xlsx', index=False)
+    Returns:
+        RecordSink: every sub variant in the store
+    """
+    store.initialize(reset=not resume)
+    limiter = get_rate_limiter()
+    with Manager() as manager, ProcessPoolExecutor(max_workers=num_of_workers, initializer=init_worker, 
+                                                   initargs=(tqdm.get_lock(), limiter, log_queue, logging.getLevelName(logger.level))) as executor:
+        task_queue = manager.Queue()
+        shared_metrics = manager.dict()
+        session = BrowserSession(browser_options, category_links[0])
+        if not session.prepare():
+            logger.error('Could not prepare a shared session. Every worker will prepare its own...')
+        futures = [executor.submit(scrape_worker, session, task_queue, i, store, incremental, shared_metrics) for i in range(num_of_workers)]
+        seed_tasks(task_queue, category_links, store, resume, session.headers)
+        drained = wait_for_tasks(task_queue, futures, shared_metrics)
+        for _ in futures:
+            task_queue.put(None)
+
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                logger.exception('A worker failed unexpectedly.', exc_info=True)
+        metric_snapshots = list(shared_metrics.values()) + [get_stage_metrics().snapshot()]
+    try:
+        export_metrics(metric_snapshots)
+        logger.info('Stage metrics written to "%s.json" and "%s.prom".', METRICS_PATH, METRICS_PATH)
+    except OSError:
+        logger.warning('Could not export metrics to "%s".', METRICS_PATH, exc_info=True)
+    failed_listing_pages = store.get_failed_listing_pages()
+    if failed_listing_pages:
+        logger.error('%d listing pages could not be loaded, their products were not queued. Run with --resume to retry them:\n%s', 
+                     len(failed_listing_pages), '\n'.join(f'{url} page {page}: {reason}' for url, page, reason in failed_listing_pages))
+    if drained and not failed_listing_pages:
+        store.update_snapshot()
+    else:
+        logger.warning('Crawl did not finish. Keeping the snapshot of the previous run.')
+    failed_products = store.get_failed_products()
+    if failed_products:
+        logger.warning('%d products could not be scraped, run with --resume to retry them:\n%s', len(failed_products), 
+                       '\n'.join(f'{url} ({category}): {reason}' for url, category, reason in failed_products))
+    return store.to_sink()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Scrape every product of the cult beauty categories.')
+    parser.add_argument('--resume', action='store_true', 
+                        help='continue the previous run from the checkpoint instead of starting over')
+    parser.add_argument('--incremental', action='store_true', 
+                        help='only deep scrape products that are new or changed since the last finished run')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help=f'sqlite file used for checkpoints. Defaults to {CHECKPOINT_PATH}')
+    parser.add_argument('--layout', choices=['wide', 'normalized', 'both'], default='wide',
+                        help='wide: one excel row per variant with a column per image and description (default). '
+                             'normalized: products, variants, images and descriptions tables. both: the tables plus the wide view derived from them')
+    parser.add_argument('--format', action='append', choices=list(EXPORTERS), dest='formats',
+                        help='output format, can be repeated. Defaults to parquet (csv when pyarrow is not installed)')
+    parser.add_argument('--excel', action='store_true', help='also derive excel workbooks from the exported files')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], type=str.upper, default=LOGGING_LEVEL,
+                        help=f'level of the log file, also set by the CULT_BEAUTY_LOG_LEVEL environment variable. Defaults to {LOGGING_LEVEL}')
+    return parser.parse_args()
+
+def main(arguments: argparse.Namespace):
+    start_time = time.time()
+    store = CheckpointStore(arguments.checkpoint)
+    formats = get_export_formats(arguments.formats)
+    sink = scrape_categories(CATEGORY_LINKS, NUM_OF_WORKERS, store, arguments.resume, arguments.incremental)
+    if arguments.layout != 'wide':
+        tables = postprocess_tables(sink.to_tables(), store)
+        store.close()
+        logger.info("Exporting normalized tables...")
+        paths = {name: export_frame(table, f'./cult_beauty_normalized_{name}', formats)[0] for name, table in tables.items()}
+        if arguments.excel:
+            export_excel(paths, './cult_beauty_normalized.xlsx')
+        if arguments.layout == 'both':
+            logger.info("Exporting wide view without duplicates derived from the normalized tables...")
+            export_output(to_wide_frame(tables, sink.get_columns()), './test_cult_beauty_without_duplicates', formats, arguments.excel)
         logger.info('Total execution time: %s', datetime.timedelta(seconds=time.time() - start_time))
+        return
 
-if __name__ == '__main__':
-    ACTION_DELAY_SEC = 1
-    JAVASCRIPT_EXECUTE_CLICK = "arguments[0].click();"
-    NUM_OF_WORKERS = 10
-    MAX_RETRY_VARIATION = 5
-    browser_options = options.Options()
-    browser_options.add_argument('-disable-notifications')
-    browser_options.add_argument('-headless')
+    df = sink.to_dataframe()
+    logger.info('Total data-frame shape: %s', df.shape)
+
+    logger.info('Renaming product_type column...')
+    df.rename({'product_type':'variant_type'}, inplace=True)
+
+    logger.info('Reordering columns...')
+    df = df.reindex(order_serialized_columns(df.columns), axis=1)
+
+    logger.info("Exporting data-frame with duplicates...")
+    export_output(df, './test_cult_beauty_with_duplicates', formats, arguments.excel)
 
-    color_variation_tags = [x.casefold() for x in ['colour:', 'color:']]
-    shade_variation_tags = [x.casefold() for x in ['shade:']]
-    size_variation_tags = [x.casefold() for x in ['size:']]
-    option_variation_tags = [x.casefold() for x in ['option:']]
-
-    CATEGORY_LINKS = ['https://www.cultbeauty.com/body-wellbeing/tanning-suncare/shop-all.list',
-                    'https://www.cultbeauty.com/skin-care.list',
-                    'https://www.cultbeauty.com/make-up.list',
-                    'https://www.cultbeauty.com/hair-care.list',
-                    'https://www.cultbeauty.com/body-wellbeing.list',
-                    'https://www.cultbeauty.com/fragrance.list',
-                    'https://www.cultbeauty.com/gifts.list',
-                    'https://www.cultbeauty.com/minis.list',
-                    'https://www.cultbeauty.com/sale.list',
-                    'https://www.cultbeauty.com/men.list']
-    logger.info('Scraping started.')
-    main()
\ No newline at end of file
+    df = postprocess(df, store)
+    store.close()
+
+    logger.info("Exporting data-frame without duplicates...")
+    export_output(df, './test_cult_beauty_without_duplicates', formats, arguments.excel)
+    logger.info('Total execution time: %s', datetime.timedelta(seconds=time.time() - start_time))
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    log_listener = setup_logging(arguments.log_level)
+    try:
+        logger.info('Scraping started.')
+        main(arguments)
+    finally:
+        log_listener.stop()
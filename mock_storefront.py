@@ -0,0 +1,459 @@
+"""Offline stand-in for the cult beauty storefront used for benchmarking the scraper.
+
+The served pages use the same class names, ids and interactions the scraper relies on
+(popups, currency settings, pagination, carousel, variant dropdowns/boxes and description accordions)
+so the real scraping functions can be run against it without touching the live website.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from http import cookies
+import hashlib
+import html
+import json
+import random
+import threading
+import time
+
+VARIANT_LABELS = {
+    'multi-shade': 'Shade:',
+    'multi-color': 'Colour:',
+    'multi-option': 'Option:',
+    'multi-size': 'Size:',
+}
+
+SHADE_NAMES = ['Ivory', 'Porcelain', 'Sand', 'Honey', 'Caramel', 'Mocha', 'Espresso', 'Rose', 'Coral', 'Berry',
+               'Plum', 'Nude', 'Peach', 'Bronze', 'Gold', 'Silver', 'Onyx', 'Pearl', 'Ruby', 'Amber']
+SIZE_NAMES = ['15ml', '30ml', '50ml', '100ml', '200ml']
+OPTION_NAMES = ['Original', 'Refill', 'Travel Size', 'Gift Set']
+BRAND_NAMES = ['GLOW LAB', 'Pure Botanics', 'DERMA CULT', 'Nordic Skin', 'Velvet & Co']
+DESCRIPTION_HEADINGS = ['Description', 'How to Use', 'Product Details', "Why It's Cult"]
+
+# smallest valid gif, padded to the requested image size when serving images
+GIF_PIXEL = bytes.fromhex('47494638396101000100800000ffffff00000021f90401000000002c00000000010001000002024401003b')
+# third party assets are served under a path containing the real host so the scraper blocking patterns apply to them
+STATIC_ASSETS = {
+    '/static/fonts/storefront-sans.woff2': ('font/woff2', b'wOF2' + b'\0' * 40_000),
+    '/static/www.googletagmanager.com/gtm.js': ('application/javascript', b'window.dataLayer = window.dataLayer || [];' + b' ' * 80_000),
+}
+
+PAGE_HEAD = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script async src="/static/www.googletagmanager.com/gtm.js"></script>
+<style>
+@font-face {{ font-family: 'Storefront Sans'; src: url('/static/fonts/storefront-sans.woff2') format('woff2'); }}
+body {{ font-family: 'Storefront Sans', sans-serif; }}
+.hidden {{ display: none; }}
+#onetrust-banner-sdk {{ position: fixed; bottom: 0; left: 0; right: 0; padding: 10px; background: #eee; z-index: 20; }}
+.emailReengagement {{ position: fixed; top: 30%; left: 30%; width: 300px; height: 150px; background: #fff; border: 1px solid #000; z-index: 10; }}
+.emailReengagement_form_container button {{ width: 40px; height: 40px; }}
+.productDescription_accordionContent {{ display: none; }}
+.productDescription_accordionContent.open {{ display: block; }}
+</style>
+</head>
+<body>
+<header>
+<button class="responsiveSubMenu_sessionSettings" onclick="document.getElementById('sessionSettings').classList.remove('hidden')">Settings</button>
+<div id="sessionSettings" class="hidden">
+<select class="sessionSettings_currencySelect">
+<option value="GBP"{gbp_selected}>&#163; (GBP)</option>
+<option value="EUR"{eur_selected}>&#8364; (EUR)</option>
+</select>
+<button class="sessionSettings_saveButton" onclick="saveSettings()">Save</button>
+</div>
+</header>
+'''
+
+PAGE_POPUPS = '''<div id="onetrust-banner-sdk" class="{consent_class}">
+<button id="onetrust-accept-btn-handler" onclick="acceptConsent()">Accept All Cookies</button>
+</div>
+<div class="emailReengagement {popup_class}">
+<div>
+<div class="emailReengagement_form_container">
+<button onclick="closePopup()"><svg width="40" height="40" viewBox="0 0 40 40"><path d="M0 0 L40 0 L40 40 L0 40 Z"></path></svg></button>
+</div>
+</div>
+</div>
+<script>
+function setCookie(name, value) {{ document.cookie = name + '=' + value + '; path=/'; }}
+function acceptConsent() {{ setCookie('OptanonAlertBoxClosed', '1'); document.getElementById('onetrust-banner-sdk').classList.add('hidden'); }}
+function closePopup() {{ setCookie('emailReengagementClosed', '1'); document.querySelector('.emailReengagement').classList.add('hidden'); }}
+function saveSettings() {{
+  setCookie('currency', document.querySelector('.sessionSettings_currencySelect').value);
+  window.location.reload();
+}}
+</script>
+'''
+
+PAGE_TAIL = '''</body>
+</html>
+'''
+
+PRODUCT_SCRIPT = '''<script>
+var variants = {variants};
+var switchDelayMs = {switch_delay_ms};
+var carouselIndex = 0;
+function nextImage() {{
+  var images = document.querySelectorAll('.athenaProductImageCarousel_image');
+  carouselIndex = (carouselIndex + 1) % images.length;
+}}
+function toggleAccordion(button) {{
+  var content = document.getElementById(button.id.replace('heading', 'content'));
+  var expanded = button.getAttribute('aria-expanded') === 'true';
+  button.setAttribute('aria-expanded', expanded ? 'false' : 'true');
+  content.classList.toggle('open');
+}}
+function showVariant(id) {{
+  var variant = variants[id];
+  if (!variant) {{ return; }}
+  setTimeout(function () {{
+    var oldPrice = document.querySelector('.productPrice_price');
+    var price = document.createElement('p');
+    price.className = 'productPrice_price';
+    price.textContent = variant.price;
+    oldPrice.parentNode.replaceChild(price, oldPrice);
+    var carousel = document.querySelector('.athenaProductImageCarousel_images');
+    carousel.innerHTML = '';
+    variant.images.forEach(function (src) {{
+      var image = document.createElement('img');
+      image.className = 'athenaProductImageCarousel_image';
+      image.src = src;
+      carousel.appendChild(image);
+    }});
+    var soldOut = document.querySelector('.productAddToBasket-soldOut');
+    var basket = document.querySelector('.productAddToBasket');
+    if (variant.sold_out && !soldOut) {{
+      var button = document.createElement('button');
+      button.className = 'productAddToBasket-soldOut';
+      button.textContent = 'Sold Out';
+      basket.appendChild(button);
+    }} else if (!variant.sold_out && soldOut) {{
+      soldOut.remove();
+    }}
+  }}, switchDelayMs);
+}}
+function selectBox(box) {{
+  var marker = document.querySelector('.athenaProductVariations_box .srf-hide');
+  if (marker) {{ marker.remove(); }}
+  var selected = document.createElement('span');
+  selected.className = 'srf-hide hidden';
+  selected.textContent = 'selected';
+  box.appendChild(selected);
+  showVariant(box.getAttribute('data-value-id'));
+}}
+</script>
+'''
+
+
+def generate_catalog(categories = 3, pages_per_category = 2, products_per_page = 6, images_per_product = 4,
+                     max_variants = 8, seed = 0, shared_products = 0.0):
+    """generate a deterministic fake catalog
+
+    Args:
+        categories (int, optional): number of categories. Defaults to 3.
+        pages_per_category (int, optional): number of listing pages in every category. Defaults to 2.
+        products_per_page (int, optional): number of products in every listing page. Defaults to 6.
+        images_per_product (int, optional): number of carousel images of every variant. Defaults to 4.
+        max_variants (int, optional): maximum number of variants of a multi variant product. Defaults to 8.
+        seed (int, optional): seed used for the random generator. Defaults to 0.
+        shared_products (float, optional): share of the listing slots after the first category reusing a product
+            of a previous category, like sale or gifts overlapping the main categories. Defaults to 0.0.
+
+    Returns:
+        dict[str, object]: the catalog with a 'categories' list and a 'products' dict keyed by product id
+    """
+    rng = random.Random(seed)
+    catalog = {'categories': [], 'products': {}}
+    next_sku = 10000000
+    product_types = ['single', 'single', 'multi-shade', 'multi-color', 'multi-size', 'multi-option']
+    for category_index in range(categories):
+        category = {'slug': f'category-{category_index + 1}', 'pages': []}
+        for _ in range(pages_per_category):
+            page = []
+            for _ in range(products_per_page):
+                if shared_products > 0 and category_index > 0 and rng.random() < shared_products:
+                    page.append(rng.choice([product_id for previous in catalog['categories'] for previous_page in previous['pages']
+                                            for product_id in previous_page]))
+                    continue
+                product_id = str(next_sku)
+                next_sku += 1
+                product_type = rng.choice(product_types)
+                brand = rng.choice(BRAND_NAMES)
+                has_reviews = rng.random() < 0.7
+                product = {
+                    'id': product_id,
+                    'slug': f'product-{product_id}',
+                    'type': product_type,
+                    'brand': brand,
+                    'name': f'{brand} Product {product_id}',
+                    'rating': round(rng.uniform(3, 5), 1) if has_reviews else None,
+                    'reviews': rng.randint(1, 500) if has_reviews else None,
+                    'descriptions': {
+                        'Description': f'A cult favourite formula number {product_id}.'
+                                       + (' We regret we cannot ship this product to the Middle East.' if rng.random() < 0.2 else ''),
+                        'How to Use': 'Apply a small amount to clean skin morning and evening.',
+                        'Product Details': f'Range:\n\n{brand.lower()} essentials',
+                        "Why It's Cult": 'Because it works.',
+                    },
+                    'variants': [],
+                }
+                if product_type == 'single':
+                    names = [None]
+                elif product_type == 'multi-size':
+                    names = SIZE_NAMES[:rng.randint(2, len(SIZE_NAMES))]
+                elif product_type == 'multi-option':
+                    names = OPTION_NAMES[:rng.randint(2, len(OPTION_NAMES))]
+                else:
+                    names = rng.sample(SHADE_NAMES, rng.randint(2, max(2, min(max_variants, len(SHADE_NAMES)))))
+                for variant_index, name in enumerate(names):
+                    if variant_index == 0:
+                        variant_sku = product_id
+                    else:
+                        variant_sku = str(next_sku)
+                        next_sku += 1
+                    product['variants'].append({
+                        'id': variant_sku,
+                        'name': name,
+                        'price': f'{rng.uniform(5, 120):.2f}',
+                        'sold_out': rng.random() < 0.1,
+                        'hex': '#%02x%02x%02x' % (rng.randrange(256), rng.randrange(256), rng.randrange(256)),
+                        'images': [f'/images/{variant_sku}-{n + 1}.jpg' for n in range(images_per_product)],
+                    })
+                catalog['products'][product_id] = product
+                page.append(product_id)
+            category['pages'].append(page)
+        catalog['categories'].append(category)
+    return catalog
+
+
+def format_price(price: str, currency: str):
+    """format a price in the currency stored in the session cookie"""
+    symbol = '€' if currency == 'EUR' else '£'
+    return f'{symbol}{price}'
+
+
+class StorefrontHandler(BaseHTTPRequestHandler):
+    """request handler serving listing, product and image routes from the server catalog"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond()
+
+    def do_HEAD(self):
+        self.respond(head_only=True)
+
+    def respond(self, head_only = False):
+        parts = urlsplit(self.path)
+        session = cookies.SimpleCookie(self.headers.get('Cookie', ''))
+        currency = session['currency'].value if 'currency' in session else 'GBP'
+        if parts.path.startswith('/images/'):
+            self.send_image(head_only)
+            return
+        if parts.path in STATIC_ASSETS:
+            self.send_asset(*STATIC_ASSETS[parts.path], head_only)
+            return
+        time.sleep(self.server.latency)
+        if parts.path.endswith('.list'):
+            slug = parts.path.strip('/').removesuffix('.list')
+            page_number = int(parse_qs(parts.query).get('pageNumber', ['1'])[0])
+            body = self.server.render_listing(slug, page_number, currency, session)
+        elif parts.path.startswith('/p/'):
+            product_id = parts.path.strip('/').split('/')[-1]
+            body = self.server.render_product(product_id, currency, session)
+        else:
+            body = None
+        if body is None:
+            self.send_error(404)
+            return
+        payload = body.encode('utf-8')
+        etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(payload)
+
+    def send_image(self, head_only = False):
+        payload = GIF_PIXEL + b'\0' * max(0, self.server.image_size - len(GIF_PIXEL))
+        self.send_asset('image/gif', payload, head_only)
+
+    def send_asset(self, content_type: str, payload: bytes, head_only = False):
+        time.sleep(self.server.asset_latency)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        if not head_only:
+            try:
+                self.wfile.write(payload)
+            except ConnectionError:
+                # the browser navigated away before a slow asset finished
+                pass
+
+
+class MockStorefront(ThreadingHTTPServer):
+    """local http server imitating the storefront. Can be used as a context manager.
+
+    Args:
+        catalog (dict[str, object], optional): catalog generated by generate_catalog. Defaults to generate_catalog().
+        host (str, optional): interface to bind to. Defaults to '127.0.0.1'.
+        port (int, optional): port to bind to, 0 picks a free port. Defaults to 0.
+        latency (float, optional): seconds to wait before answering every html request. Defaults to 0.
+        switch_delay (float, optional): seconds the product page takes to render a newly selected variant. Defaults to 0.05.
+        image_size (int, optional): size in bytes of every served image. Defaults to 50_000.
+        asset_latency (float, optional): seconds to wait before answering every image, font or tracker request. Defaults to 0.
+    """
+    daemon_threads = True
+
+    def __init__(self, catalog = None, host = '127.0.0.1', port = 0, latency = 0.0, switch_delay = 0.05, image_size = 50_000,
+                 asset_latency = 0.0):
+        super().__init__((host, port), StorefrontHandler)
+        self.catalog = catalog if catalog is not None else generate_catalog()
+        self.latency = latency
+        self.switch_delay = switch_delay
+        self.image_size = image_size
+        self.asset_latency = asset_latency
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def category_links(self):
+        return [f'{self.base_url}/{category["slug"]}.list' for category in self.catalog['categories']]
+
+    @property
+    def product_links(self):
+        return [f'{self.base_url}/p/{self.catalog["products"][product_id]["slug"]}/{product_id}/'
+                for category in self.catalog['categories'] for page in category['pages'] for product_id in page]
+
+    @property
+    def product_count(self):
+        return sum(len(page) for category in self.catalog['categories'] for page in category['pages'])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def render_page(self, title: str, content: str, currency: str, session: cookies.SimpleCookie):
+        head = PAGE_HEAD.format(title=html.escape(title), gbp_selected=' selected' if currency != 'EUR' else '',
+                                eur_selected=' selected' if currency == 'EUR' else '')
+        popups = PAGE_POPUPS.format(consent_class='hidden' if 'OptanonAlertBoxClosed' in session else '',
+                                    popup_class='hidden' if 'emailReengagementClosed' in session else '')
+        return head + content + popups + PAGE_TAIL
+
+    def render_listing(self, slug: str, page_number: int, currency: str, session: cookies.SimpleCookie):
+        category = next((x for x in self.catalog['categories'] if x['slug'] == slug), None)
+        if category is None or not 1 <= page_number <= len(category['pages']):
+            return None
+        blocks = []
+        for product_id in category['pages'][page_number - 1]:
+            product = self.catalog['products'][product_id]
+            blocks.append(f'''<li class="productListProducts_product">
+<div class="productBlock_itemDetails_wrapper">
+<a class="productBlock_link" href="/p/{product['slug']}/{product_id}/">
+<h3 class="productBlock_productName">{html.escape(product['name'])}</h3>
+</a>
+<span class="productBlock_priceValue">{format_price(product['variants'][0]['price'], currency)}</span>
+</div>
+</li>''')
+        last_page = len(category['pages'])
+        pagination = (f'<nav><a class="responsivePaginationButton responsivePageSelector responsivePaginationButton--last" '
+                      f'href="/{slug}.list?pageNumber={last_page}">{last_page}</a></nav>')
+        content = f'<main><ul class="productListProducts_products">{"".join(blocks)}</ul>{pagination}</main>\n'
+        return self.render_page(slug, content, currency, session)
+
+    def render_product(self, product_id: str, currency: str, session: cookies.SimpleCookie):
+        product = self.catalog['products'].get(product_id)
+        if product is None:
+            return None
+        primary = product['variants'][0]
+        images = ''.join(f'<img class="athenaProductImageCarousel_image" src="{src}" alt="">' for src in primary['images'])
+        rating = ''
+        if product['rating'] is not None:
+            rating = (f'<div class="productReviewStarsPresentational" aria-label="{product["rating"]} Stars"></div>'
+                      f'<span class="productReviewStars_numberOfReviews">{product["reviews"]} Reviews</span>')
+        sold_out = '<button class="productAddToBasket-soldOut">Sold Out</button>' if primary['sold_out'] else ''
+        variations = ''
+        if product['type'] in ('multi-shade', 'multi-color', 'multi-option'):
+            options = ''.join(f'<option value="{x["id"]}">{html.escape(x["name"])}{" - Out of stock" if x["sold_out"] else ""}</option>'
+                              for x in product['variants'])
+            swatches = ''
+            if product['type'] != 'multi-option':
+                swatches = ''.join(f'<span data-value-id="{x["id"]}" style="background-color: {x["hex"]}"></span>' for x in product['variants'])
+            variations = (f'<label class="athenaProductVariations_dropdownLabel">{VARIANT_LABELS[product["type"]]}</label>'
+                          f'<select class="athenaProductVariations_dropdown" onchange="showVariant(this.value)">'
+                          f'<option value="">Please choose...</option>{options}</select>'
+                          f'<div class="athenaProductVariations_swatches">{swatches}</div>')
+        elif product['type'] == 'multi-size':
+            selected_marker = '<span class="srf-hide hidden">selected</span>'
+            boxes = ''.join(f'<button class="athenaProductVariations_box" data-value-id="{x["id"]}" onclick="selectBox(this)">'
+                            f'{html.escape(x["name"])}{selected_marker if i == 0 else ""}</button>'
+                            for i, x in enumerate(product['variants']))
+            variations = (f'<label class="athenaProductVariations_dropdownLabel">{VARIANT_LABELS[product["type"]]}</label>'
+                          f'<div class="athenaProductVariations_boxes">{boxes}</div>')
+        accordions = ''.join(f'<button class="productDescription_accordionControl" id="product-description-heading-{i}" aria-expanded="false" '
+                             f'onclick="toggleAccordion(this)">{html.escape(heading)}</button>'
+                             f'<div class="productDescription_accordionContent" id="product-description-content-{i}">'
+                             f'{html.escape(product["descriptions"][heading]).replace(chr(10), "<br>")}</div>'
+                             for i, heading in enumerate(DESCRIPTION_HEADINGS))
+        variants = {x['id']: {'price': format_price(x['price'], currency), 'images': x['images'], 'sold_out': x['sold_out']}
+                    for x in product['variants']}
+        content = f'''<main>
+<img class="productBrandLogo_image" title="{html.escape(product['brand'])}" src="/images/brand-{product_id}.jpg" alt="">
+<h1 class="productName_title">{html.escape(product['name'])}</h1>
+{rating}
+<div class="athenaProductImageCarousel">
+<div class="athenaProductImageCarousel_images">{images}</div>
+<button class="athenaProductImageCarousel_rightArrow" onclick="nextImage()">&gt;</button>
+</div>
+<div class="productPrice"><p class="productPrice_price">{format_price(primary['price'], currency)}</p></div>
+{variations}
+<div class="productAddToBasket">{sold_out}</div>
+<div class="productDescription">{accordions}</div>
+</main>
+{PRODUCT_SCRIPT.format(variants=json.dumps(variants), switch_delay_ms=int(self.switch_delay * 1000))}'''
+        return self.render_page(product['name'], content, currency, session)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve a fake cult beauty storefront for local testing.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering every html request')
+    parser.add_argument('--asset-latency', type=float, default=0.0, help='seconds to wait before answering every image, font or tracker request')
+    args = parser.parse_args()
+    with MockStorefront(port=args.port, latency=args.latency, asset_latency=args.asset_latency) as storefront:
+        print('Serving categories:')
+        for link in storefront.category_links:
+            print(f'  {link}')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass